@@ -0,0 +1,105 @@
+import glob
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from pipeline import compile_cached, describe_error, execute_bytecode
+from vm import Engine
+
+
+class BatchResult:
+    """
+    What running one program in a batch produced. stage is where it stopped:
+    "compile" or "run" on an error, "worker" if the process running it died,
+    "done" otherwise.
+    """
+
+    def __init__(self, path, stage, output, error, compile_time, run_time):
+        self.path = path
+        self.stage = stage
+        self.output = output
+        self.error = error
+        self.compile_time = compile_time
+        self.run_time = run_time
+
+    @property
+    def ok(self):
+        return self.stage == "done"
+
+
+def collect_sources(patterns) -> list[Path]:
+    """
+    Expands directories into the .ente files below them and globs into the
+    files they match. Paths are deduplicated and keep the order given.
+    """
+    sources = {}
+
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(path.rglob("*.ente"))
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = sorted(
+                Path(match) for match in glob.glob(pattern, recursive=True)
+            )
+
+        for match in matches:
+            if match.is_file():
+                sources.setdefault(match.resolve(), match)
+
+    return list(sources.values())
+
+
+def run_batch(sources, level=1, engine=Engine.REFERENCE, jobs=None):
+    """
+    Compiles and runs every source in a pool of jobs worker processes,
+    yielding a BatchResult for each as it finishes. A worker that dies, say
+    from running out of memory, breaks the pool, and every program that had
+    not finished yet gets a failed result rather than ending the batch.
+    """
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_start_worker) as pool:
+        futures = {
+            pool.submit(run_file, source, level, engine): source for source in sources
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                error = str(e) or "worker process died"
+                yield BatchResult(futures[future], "worker", "", error, 0.0, 0.0)
+
+
+def run_file(path, level=1, engine=Engine.REFERENCE) -> BatchResult:
+    """Compiles and runs one program, capturing what it prints."""
+    stream = io.StringIO()
+    compile_time = run_time = 0.0
+
+    start = time.perf_counter()
+    try:
+        bytecode = compile_cached(Path(path).read_text(), level)
+    except Exception as e:
+        compile_time = time.perf_counter() - start
+        return BatchResult(path, "compile", "", str(e), compile_time, run_time)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        execute_bytecode(bytecode, engine, None, stream)
+    except Exception as e:
+        run_time = time.perf_counter() - start
+        return BatchResult(
+            path, "run", stream.getvalue(), describe_error(e), compile_time, run_time
+        )
+    run_time = time.perf_counter() - start
+
+    return BatchResult(path, "done", stream.getvalue(), None, compile_time, run_time)
+
+
+def _start_worker():
+    # each program gets its own parser instance, but the parser class and its
+    # LALR tables are built once per worker rather than once per file
+    import parser  # noqa: F401
@@ -0,0 +1,193 @@
+import io
+import json
+import platform
+import time
+from pathlib import Path
+from typing import Optional
+
+import typer
+from typing_extensions import Annotated
+
+from benchmarks.generators import SUITE
+from bytecode import encode_bytecode, load_bytecode
+from lexer import EnteLexer
+from memory import MemoryManager
+from optimizer import optimize
+from output import OutputBuffer
+from parser import EnteParser
+from vm import Engine, VirtualMachine
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+cli = typer.Typer()
+
+
+def measure(run, repeat, setup=None):
+    """
+    Best time of repeat calls to run, and its last result. setup, if given,
+    prepares a fresh argument for each call outside the timed region.
+    """
+    best = float("inf")
+    result = None
+
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        result = run(argument) if setup is not None else run()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def bench(text, engines, level=1, repeat=3) -> dict:
+    """Times each compiler and virtual machine phase for one program."""
+    timings = {}
+
+    def parse(tokens):
+        parser = EnteParser(fold_constants=level > 0)
+        parser.parse(iter(tokens), text)
+        return parser
+
+    def parsed():
+        return parse(list(EnteLexer().tokenize(text)))
+
+    def encode(parser):
+        constant_table, counter_table = parser.memory_assigner.output()
+        quadruples = parser.quadruples
+        return encode_bytecode(
+            counter_table,
+            constant_table,
+            quadruples.code,
+            (quadruples.lines, quadruples.columns),
+        )
+
+    def optimized():
+        parser = parsed()
+        optimize(parser.quadruples, parser.memory_assigner, level)
+        return parser
+
+    def loaded():
+        memory_manager = MemoryManager()
+        code, _ = load_bytecode(bytecode, memory_manager)
+        return memory_manager, code
+
+    timings["lex"], tokens = measure(lambda: list(EnteLexer().tokenize(text)), repeat)
+    timings["parse"], _ = measure(lambda: parse(tokens), repeat)
+    timings["optimize"], _ = measure(
+        lambda parser: optimize(parser.quadruples, parser.memory_assigner, level),
+        repeat,
+        parsed,
+    )
+    timings["encode"], bytecode = measure(encode, repeat, optimized)
+    timings["load"], _ = measure(
+        lambda: load_bytecode(bytecode, MemoryManager())[0].release(), repeat
+    )
+
+    for engine in engines:
+
+        def execute(state):
+            memory_manager, code = state
+            vm = VirtualMachine(memory_manager, output=OutputBuffer(io.StringIO()))
+            try:
+                vm.run(code, engine)
+            finally:
+                code.release()
+
+        timings[f"execute:{engine.value}"], _ = measure(execute, repeat, loaded)
+
+    return timings
+
+
+def compare(results, baseline, threshold, floor):
+    """
+    Prints every timing next to its baseline and returns the ones that got
+    slower by more than threshold times and floor seconds.
+    """
+    regressions = []
+
+    for name, timings in results.items():
+        for phase, seconds in timings.items():
+            before = baseline.get(name, {}).get(phase)
+            if before is None:
+                print(f"{name:<16} {phase:<20} {seconds * 1000:10.2f}ms")
+                continue
+
+            ratio = seconds / before if before else float("inf")
+            regressed = ratio > threshold and seconds - before > floor
+            print(
+                f"{name:<16} {phase:<20} {seconds * 1000:10.2f}ms"
+                f" {before * 1000:10.2f}ms {ratio:6.2f}x"
+                f"{'  REGRESSION' if regressed else ''}"
+            )
+            if regressed:
+                regressions.append((name, phase, ratio))
+
+    return regressions
+
+
+@cli.command(help="Time the compiler and VM on generated programs.")
+def main(
+    only: Annotated[
+        Optional[list[str]], typer.Option(help="Benchmarks to run, all by default")
+    ] = None,
+    engine: Annotated[
+        Optional[list[Engine]], typer.Option(help="Engines to time execution on")
+    ] = None,
+    level: Annotated[int, typer.Option("--optimize", "-O")] = 1,
+    repeat: Annotated[int, typer.Option(help="Runs per phase, best is kept")] = 3,
+    report: Annotated[
+        Optional[Path], typer.Option(help="Write the JSON report here")
+    ] = None,
+    baseline: Annotated[
+        Path, typer.Option(help="Baseline report to compare against")
+    ] = BASELINE_PATH,
+    save_baseline: Annotated[
+        bool, typer.Option(help="Store this run as the new baseline")
+    ] = False,
+    threshold: Annotated[
+        float, typer.Option(help="Slowdown ratio that counts as a regression")
+    ] = 1.25,
+    floor: Annotated[
+        float, typer.Option(help="Ignore slowdowns of fewer seconds than this")
+    ] = 0.001,
+):
+    names = only or list(SUITE)
+    engines = engine or [
+        Engine.REFERENCE,
+        Engine.RESOLVED,
+        Engine.THREADED,
+        Engine.COMPILED,
+    ]
+
+    results = {}
+    for name in names:
+        results[name] = bench(SUITE[name](), engines, level, repeat)
+
+    data = {
+        "python": platform.python_version(),
+        "level": level,
+        "repeat": repeat,
+        "results": results,
+    }
+
+    stored = {}
+    if baseline.is_file():
+        stored = json.loads(baseline.read_text())
+        if stored.get("level") != level:
+            print(f"baseline was taken at -O {stored.get('level')}, not -O {level}")
+
+    regressions = compare(results, stored.get("results", {}), threshold, floor)
+
+    if report is not None:
+        report.write_text(json.dumps(data, indent=2) + "\n")
+    if save_baseline:
+        baseline.write_text(json.dumps(data, indent=2) + "\n")
+        print(f"baseline saved to {baseline}")
+
+    if regressions and not save_baseline:
+        print(f"{len(regressions)} regressions")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    cli()
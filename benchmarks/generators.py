@@ -0,0 +1,108 @@
+def program(name, variables, body, functions=()):
+    """Wraps declarations, functions and main's statements into a program."""
+    lines = [f"program {name};"]
+    for data_type, names in variables.items():
+        lines.append(f"var {', '.join(names)} : {data_type};")
+    lines.extend(functions)
+    lines.append("main {")
+    lines.extend(f"    {statement};" for statement in body)
+    lines.append("};")
+    lines.append("end;")
+    return "\n".join(lines) + "\n"
+
+
+def expression_tree(depth=8):
+    """One write of a balanced tree of + - * over 2**depth leaves."""
+    names = ["a", "b", "c", "d"]
+    operators = ["+", "*", "-"]
+
+    def tree(level, position):
+        if level == 0:
+            return names[position % len(names)]
+        left = tree(level - 1, position * 2)
+        right = tree(level - 1, position * 2 + 1)
+        return f"({left} {operators[level % len(operators)]} {right})"
+
+    body = ["a = 1", "b = 2", "c = 3", "d = 1", f"write({tree(depth, 0)})"]
+    return program("expression_tree", {"int": names}, body)
+
+
+def nested_loops(depth=3, iterations=20):
+    """depth nested while loops of iterations each, counting the innermost body."""
+    counters = [f"i{level}" for level in range(depth)]
+
+    statement = "s = s + 1"
+    for counter in reversed(counters):
+        statement = (
+            f"{counter} = 0; "
+            f"while ({counter} < {iterations}) {{ {statement}; "
+            f"{counter} = {counter} + 1; }}"
+        )
+
+    body = ["s = 0", statement, "write(s)"]
+    return program("nested_loops", {"int": ["s", *counters]}, body)
+
+
+def many_functions(count=100, params=8):
+    """count functions taking params int parameters each, all called from main."""
+    names = [f"p{i}" for i in range(params)]
+    signature = ", ".join(f"{name}: int" for name in names)
+
+    functions = [
+        f"void f{i}({signature}) {{\n"
+        f"    var r : int;\n"
+        f"    r = {' + '.join(names)};\n"
+        f"    write(r);\n"
+        f"}};"
+        for i in range(count)
+    ]
+
+    args = ", ".join(str(i) for i in range(params))
+    body = [f"f{i}({args})" for i in range(count)]
+    return program("many_functions", {}, body, functions)
+
+
+def constant_pool(count=2000):
+    """count assignments of distinct int, float and string literals."""
+    body = []
+    for i in range(count):
+        match i % 3:
+            case 0:
+                body.append(f"n = {i}")
+            case 1:
+                body.append(f"f = {i}.5")
+            case _:
+                body.append(f'm = "constant {i}"')
+    body.append("write(n)")
+
+    return program(
+        "constant_pool", {"int": ["n"], "float": ["f"], "string": ["m"]}, body
+    )
+
+
+def straight_line(count=900):
+    """
+    count assignments with no branches between them, each adding a small
+    constant to another variable. Every one takes a temporary.
+    """
+    names = ["a", "b", "c", "d"]
+    body = ["a = 1", "b = 2", "c = 3", "d = 4"]
+
+    for i in range(count):
+        target = names[i % 4]
+        source = names[(i + 1) % 4]
+        body.append(f"{target} = {source} + {i % 10}")
+    body.append("write(a)")
+
+    return program("straight_line", {"int": names}, body)
+
+
+# Sizes stay inside what a program can address: every memory segment, such
+# as int temporaries or float constants, holds at most 1000 values.
+SUITE = {
+    "expression_tree": expression_tree,
+    "nested_loops": nested_loops,
+    "many_functions": many_functions,
+    "constant_pool": constant_pool,
+    "straight_line": straight_line,
+}
@@ -0,0 +1,205 @@
+import struct
+import sys
+from array import array
+
+from memory import MemoryManager
+
+# Layout of a bytecode file, all header fields little-endian:
+#
+#   header     magic, version, byte order of the code section, quad count
+#   globals    count, then (name, size) per global segment
+#   locals     count, then (function address, count, (name, size)...) per function
+#   constants  count, then (address, value) per constant
+#   lines      byte length, then per quadruple the change in source line from
+#              the previous one, then per quadruple its column, as varints
+#   code       padded to 4 bytes, then 4 int32 per quadruple
+#
+# VERSION changes with the layout and with the set of operators.
+MAGIC = b"ENTE"
+VERSION = 4
+
+HEADER = struct.Struct("<4sHBxI")
+COUNT = struct.Struct("<I")
+TEXT = struct.Struct("<H")
+SIZE = struct.Struct("<I")
+ADDRESS = struct.Struct("<i")
+CONSTANT = struct.Struct("<iI")
+QUAD_SIZE = 16
+
+BYTE_ORDERS = {"little": 0, "big": 1}
+
+
+class LineTable:
+    """
+    Source line and column of every quadruple. The table stays encoded until
+    a position is first asked for, which only error reports and profiles do.
+    """
+
+    def __init__(self, data: bytes, count: int):
+        self.data = data
+        self.count = count
+        self.lines = None
+        self.columns = None
+
+    def __getitem__(self, ip) -> tuple[int, int]:
+        if self.lines is None:
+            self.lines, self.columns = decode_lines(self.data, self.count)
+        return self.lines[ip], self.columns[ip]
+
+    def __len__(self):
+        return self.count
+
+
+def encode_lines(lines, columns) -> bytes:
+    encoded = bytearray()
+
+    def varint(value):
+        while value > 0x7F:
+            encoded.append(value & 0x7F | 0x80)
+            value >>= 7
+        encoded.append(value)
+
+    previous = 0
+    for line in lines:
+        delta = line - previous
+        varint(delta << 1 if delta >= 0 else (-delta << 1) - 1)
+        previous = line
+    for column in columns:
+        varint(column)
+
+    return bytes(encoded)
+
+
+def decode_lines(data: bytes, count: int) -> tuple[array, array]:
+    values = array("i")
+    value = shift = 0
+
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            values.append(value)
+            value = shift = 0
+
+    lines = array("i")
+    line = 0
+    for delta in values[:count]:
+        line += delta >> 1 if not delta & 1 else -((delta + 1) >> 1)
+        lines.append(line)
+
+    return lines, values[count:]
+
+
+def encode_bytecode(counter_table, constant_table, code: array, lines=None) -> bytes:
+    """
+    Encodes a program. lines is a (lines, columns) pair of arrays with the
+    source position of every quadruple; without it, positions are all 0.
+    """
+    chunks = [HEADER.pack(MAGIC, VERSION, BYTE_ORDERS[sys.byteorder], len(code) // 4)]
+
+    def text(value):
+        encoded = str(value).encode()
+        chunks.append(TEXT.pack(len(encoded)))
+        chunks.append(encoded)
+
+    chunks.append(COUNT.pack(len(counter_table["global"])))
+    for mem_type, size in counter_table["global"].items():
+        text(mem_type)
+        chunks.append(SIZE.pack(size))
+
+    chunks.append(COUNT.pack(len(counter_table["local"])))
+    for function, table in counter_table["local"].items():
+        chunks.append(ADDRESS.pack(function))
+        chunks.append(COUNT.pack(len(table)))
+        for mem_type, size in table.items():
+            text(mem_type)
+            chunks.append(SIZE.pack(size))
+
+    chunks.append(COUNT.pack(len(constant_table)))
+    for address, value in constant_table.items():
+        encoded = str(value).encode()
+        chunks.append(CONSTANT.pack(address, len(encoded)))
+        chunks.append(encoded)
+
+    if lines is None:
+        lines = ([0] * (len(code) // 4), [0] * (len(code) // 4))
+    table = encode_lines(*lines)
+    chunks.append(SIZE.pack(len(table)))
+    chunks.append(table)
+
+    offset = sum(len(chunk) for chunk in chunks)
+    chunks.append(b"\0" * (-offset % 4))
+    chunks.append(code.tobytes())
+
+    return b"".join(chunks)
+
+
+def load_bytecode(
+    buffer, memory_manager: MemoryManager
+) -> tuple[memoryview, LineTable]:
+    """
+    Describes, allocates and fills memory_manager from a bytecode buffer and
+    returns its code section as a flat int view over the same buffer, 4 ints
+    per quadruple, along with its line table. The caller must release the
+    view before closing buffer.
+    """
+    magic, version, byte_order, quad_count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("not an Ente bytecode file")
+    if version != VERSION:
+        raise ValueError(f"unsupported bytecode version: {version}")
+
+    offset = HEADER.size
+
+    def unpack(fmt):
+        nonlocal offset
+        values = fmt.unpack_from(buffer, offset)
+        offset += fmt.size
+        return values
+
+    def text():
+        nonlocal offset
+        (length,) = unpack(TEXT)
+        value = bytes(buffer[offset : offset + length]).decode()
+        offset += length
+        return value
+
+    (global_count,) = unpack(COUNT)
+    for _ in range(global_count):
+        mem_type = text()
+        (size,) = unpack(SIZE)
+        memory_manager.describe(mem_type=mem_type, size=size)
+
+    (function_count,) = unpack(COUNT)
+    for _ in range(function_count):
+        (function,) = unpack(ADDRESS)
+        (segment_count,) = unpack(COUNT)
+        for _ in range(segment_count):
+            mem_type = text()
+            (size,) = unpack(SIZE)
+            memory_manager.describe(mem_type=mem_type, size=size, function=function)
+
+    for key, value in memory_manager.descriptor["global"].items():
+        memory_manager.allocate(key, value)
+
+    (constant_count,) = unpack(COUNT)
+    for _ in range(constant_count):
+        address, length = unpack(CONSTANT)
+        value = bytes(buffer[offset : offset + length]).decode()
+        offset += length
+        memory_manager.assign(address, value)
+
+    (size,) = unpack(SIZE)
+    lines = LineTable(bytes(buffer[offset : offset + size]), quad_count)
+    offset += size
+
+    offset += -offset % 4
+    code = memoryview(buffer)[offset : offset + quad_count * QUAD_SIZE].cast("i")
+
+    if byte_order != BYTE_ORDERS[sys.byteorder]:
+        swapped = array("i", code)
+        swapped.byteswap()
+        code.release()
+        code = memoryview(swapped)
+
+    return code, lines
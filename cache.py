@@ -0,0 +1,134 @@
+import hashlib
+import marshal
+import os
+from pathlib import Path
+
+# Everything the compiler caches between runs lives here. ENTE_CACHE_DIR
+# moves it, e.g. to a shared directory for batch jobs.
+CACHE_DIR = Path(os.environ.get("ENTE_CACHE_DIR", Path.home() / ".cache" / "ente"))
+
+# Compiled programs kept for run are evicted, least recently used first, once
+# they take more than this many bytes.
+BYTECODE_CACHE_SIZE = int(os.environ.get("ENTE_CACHE_SIZE", 64 * 1024 * 1024))
+
+# Modules whose source decides what bytecode a program compiles to.
+COMPILER_MODULES = (
+    "bytecode.py",
+    "cfg.py",
+    "lexer.py",
+    "memory.py",
+    "operators.py",
+    "optimizer.py",
+    "parser.py",
+    "quadruples.py",
+    "semantics.py",
+    "stack.py",
+    "symbol_table.py",
+)
+
+
+class ParseTables:
+    """The parts of SLY's LRTable that Parser.parse reads."""
+
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+
+
+def grammar_hash(grammar) -> str:
+    """
+    Hashes what the LALR tables are built from: the productions, in order,
+    the precedence table and the SLY version that builds them.
+    """
+    # imported here, so running cached bytecode never loads SLY
+    import sly
+
+    digest = hashlib.sha256(sly.__version__.encode())
+    for production in grammar.Productions:
+        digest.update(
+            repr((production.name, production.prod, production.prec)).encode()
+        )
+    digest.update(repr(sorted(grammar.Precedence.items())).encode())
+    return digest.hexdigest()
+
+
+def load_parse_tables(grammar):
+    """
+    Returns parse tables for grammar, read from the cache when a grammar
+    with the same hash was built before, and built and cached otherwise.
+    """
+    path = CACHE_DIR / f"parsetab-{grammar_hash(grammar)[:16]}.marshal"
+
+    try:
+        return ParseTables(*marshal.loads(path.read_bytes()))
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    from sly.yacc import LRTable
+
+    table = LRTable(grammar)
+    data = marshal.dumps((table.lr_action, table.lr_goto, table.defaulted_states))
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+    except OSError:
+        pass
+
+    return table
+
+
+def write_atomic(path: Path, data: bytes):
+    """
+    Writes data to a file of this process's own next to path and renames it
+    into place, so concurrent runs never read a partial file. Errors raise
+    after the partial file is removed.
+    """
+    partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def compiler_hash() -> str:
+    """Hashes the compiler's own source, so any change to it misses the cache."""
+    digest = hashlib.sha256()
+    root = Path(__file__).parent
+    for module in COMPILER_MODULES:
+        digest.update((root / module).read_bytes())
+    return digest.hexdigest()
+
+
+def bytecode_path(source: str, level: int) -> Path:
+    """Where run keeps the bytecode for source compiled at level."""
+    digest = hashlib.sha256(compiler_hash().encode())
+    digest.update(str(level).encode())
+    digest.update(source.encode())
+    return CACHE_DIR / "bytecode" / f"{digest.hexdigest()}.en"
+
+
+def evict_bytecode(limit: int = BYTECODE_CACHE_SIZE):
+    """
+    Removes the least recently used compiled programs, and the Python code
+    cached next to them, until the bytecode cache fits in limit bytes.
+    """
+    entries = []
+    for path in (CACHE_DIR / "bytecode").glob("*.en*"):
+        if path.suffix == ".tmp":
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -0,0 +1,249 @@
+from memory import get_type
+from operators import BRANCHES, OPERATIONS, Operator as Op
+
+# jumps within a function, and all jumps
+GOTOS = (Op.GOTO, Op.GOTOF, Op.GOTOT, *BRANCHES)
+JUMPS = (*GOTOS, Op.GOSUB)
+
+
+def operands(quad):
+    """Addresses a quadruple reads from."""
+    operator, left, right, _ = quad
+
+    if operator in OPERATIONS or operator in BRANCHES:
+        return (left, right)
+    if operator in (Op.ASSIGN, Op.PRINT, Op.PARAM, Op.GOTOF, Op.GOTOT):
+        return (left,)
+    return ()
+
+
+def writes(quad):
+    """Addresses a quadruple writes to."""
+    if quad[0] in OPERATIONS or quad[0] == Op.ASSIGN:
+        return (quad[3],)
+    return ()
+
+
+def is_variable(address):
+    """Whether address holds a variable or temporary, as opposed to a constant."""
+    segment = get_type(address)
+    return segment[0] in "gtl" and segment != "g_void"
+
+
+class BasicBlock:
+    """
+    Quadruples start to end, exclusive, that always run together. successors
+    are the blocks control can continue to within the same function; a block
+    ending in GOSUB continues at the return point and calls callee.
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.successors = []
+        self.callee = None
+        self.live_in = set()
+        self.live_out = set()
+
+    def __repr__(self):
+        return f"BasicBlock({self.start}, {self.end})"
+
+
+class ControlFlowGraph:
+    """
+    Splits quadruples into basic blocks at jumps, calls and ENDFUNC, and
+    works out which blocks run and which variables are live between them.
+    quads is a list of [operator, left, right, result], where None marks a
+    quadruple that an earlier pass removed.
+    """
+
+    def __init__(self, quads):
+        self.quads = quads
+        self.blocks = []
+        self.block_at = {}
+        self.globals = set()
+
+        self.build()
+
+    def build(self):
+        quads = self.quads
+        end = len(quads)
+
+        leaders = {0}
+        for i, quad in enumerate(quads):
+            if quad is None:
+                continue
+            if quad[0] in JUMPS:
+                leaders.add(quad[3])
+            if quad[0] in JUMPS or quad[0] == Op.ENDFUNC:
+                leaders.add(i + 1)
+        leaders = sorted(leader for leader in leaders if leader < end)
+
+        for start, stop in zip(leaders, [*leaders[1:], end]):
+            block = BasicBlock(start, stop)
+            self.blocks.append(block)
+            self.block_at[start] = block
+
+        for block in self.blocks:
+            last = self.last(block)
+            operator = last[0] if last is not None else None
+            target = last[3] if last is not None else None
+
+            following = []
+            if block.end < end and operator not in (Op.GOTO, Op.ENDFUNC):
+                following = [self.block_at[block.end]]
+
+            if operator == Op.GOSUB:
+                block.callee = self.block_at.get(target)
+                block.successors = following
+            elif operator in GOTOS and target < end:
+                block.successors = [self.block_at[target], *following]
+            else:
+                block.successors = following
+
+    def tail(self, block):
+        """Index of the block's last quadruple that was not removed, if any."""
+        for i in range(block.end - 1, block.start - 1, -1):
+            if self.quads[i] is not None:
+                return i
+        return None
+
+    def last(self, block):
+        """The block's last quadruple that was not removed, if any."""
+        tail = self.tail(block)
+        return self.quads[tail] if tail is not None else None
+
+    def reachable(self) -> set:
+        """Start indices of the blocks some path from the first one reaches."""
+        seen = set()
+        pending = [self.blocks[0]] if self.blocks else []
+
+        while pending:
+            block = pending.pop()
+            if block.start in seen:
+                continue
+            seen.add(block.start)
+            pending.extend(block.successors)
+            if block.callee is not None:
+                pending.append(block.callee)
+
+        return seen
+
+    def loops(self) -> list:
+        """
+        Natural loops as (header, latch) quadruple indices, innermost first.
+        The jump at latch goes back to header, and the loop is every block
+        from header's to latch's. Loops that other blocks lie in between of,
+        or that can be entered other than through header, are left out.
+        """
+        predecessors = {block.start: [] for block in self.blocks}
+        for block in self.blocks:
+            for successor in block.successors:
+                predecessors[successor.start].append(block)
+
+        loops = []
+        for latch_block in self.blocks:
+            latch = self.tail(latch_block)
+            if latch is None:
+                continue
+            operator, _, _, target = self.quads[latch]
+            if operator not in GOTOS or target > latch:
+                continue
+
+            # the blocks that reach the back edge without going through the
+            # header are the loop's body
+            body = {target}
+            pending = [latch_block]
+            while pending:
+                block = pending.pop()
+                if block.start not in body:
+                    body.add(block.start)
+                    pending.extend(predecessors[block.start])
+
+            between = {
+                block.start
+                for block in self.blocks
+                if target <= block.start <= latch_block.start
+            }
+            entered = any(
+                predecessor.start not in body
+                for start in body - {target}
+                for predecessor in predecessors[start]
+            )
+            if body == between and not entered:
+                loops.append((target, latch))
+
+        return sorted(loops, key=lambda loop: loop[1] - loop[0])
+
+    def exit_live(self, block):
+        """Variables live after a block because control leaves its function."""
+        last = self.last(block)
+        if last is not None and last[0] == Op.ENDFUNC:
+            return set(self.globals)
+        return set()
+
+    def transfer(self, block, live):
+        """
+        Walks a block backwards, updating live from the variables live after
+        it to those live before it. Yields each quadruple's index, the
+        quadruple and the variables live right after it; a quadruple the
+        caller sets to None meanwhile is skipped. Needs liveness() first.
+        """
+        for i in range(block.end - 1, block.start - 1, -1):
+            quad = self.quads[i]
+            if quad is None:
+                continue
+            yield i, quad, live
+            if self.quads[i] is None:
+                continue
+            live.difference_update(writes(quad))
+            live.update(address for address in operands(quad) if is_variable(address))
+            if quad[0] == Op.GOSUB:
+                live.update(self.globals)
+
+    def use_def(self, block):
+        """
+        Variables the block reads before writing them, and variables it
+        writes.
+        """
+        uses, defs = set(), set()
+        for i in range(block.start, block.end):
+            quad = self.quads[i]
+            if quad is None:
+                continue
+            uses.update(
+                address
+                for address in operands(quad)
+                if is_variable(address) and address not in defs
+            )
+            if quad[0] == Op.GOSUB:
+                uses.update(self.globals - defs)
+            defs.update(writes(quad))
+        return uses, defs
+
+    def liveness(self):
+        """Fills in live_in and live_out of every block, to a fixed point."""
+        # a call may read any global, and a function returns with all of
+        # them live, since its callers may read them next
+        self.globals = {
+            quad[3]
+            for quad in self.quads
+            if quad is not None and writes(quad) and get_type(quad[3])[:2] == "g_"
+        }
+
+        use_def = {block.start: self.use_def(block) for block in self.blocks}
+
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(self.blocks):
+                live_out = self.exit_live(block)
+                for successor in block.successors:
+                    live_out |= successor.live_in
+
+                uses, defs = use_def[block.start]
+                live_in = uses | (live_out - defs)
+
+                if live_in != block.live_in or live_out != block.live_out:
+                    block.live_in, block.live_out = live_in, live_out
+                    changed = True
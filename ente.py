@@ -0,0 +1,142 @@
+import io
+import time
+
+from bytecode import HEADER
+from output import OutputBuffer
+from pipeline import compile_bytecode, describe_error, execute_buffer
+from tracer import CountingTracer
+from vm import Engine
+
+
+class LimitExceeded(RuntimeError):
+    pass
+
+
+class Limits:
+    """
+    Bounds on a single run. max_branches caps the jumps a program takes,
+    which bounds its loops, max_depth how deep calls nest, and max_output how
+    many characters it prints. None leaves a bound off.
+    """
+
+    def __init__(self, max_branches=None, max_depth=None, max_output=None):
+        self.max_branches = max_branches
+        self.max_depth = max_depth
+        self.max_output = max_output
+
+
+class RunResult:
+    """
+    How a run ended. status is "ok", "error" when the program failed, or
+    "limit" when it hit one of its Limits; error holds the message for both.
+    output is what the program printed, unless it printed to a stream of the
+    caller's.
+    """
+
+    def __init__(self, status, output, error, counters):
+        self.status = status
+        self.output = output
+        self.error = error
+        self.counters = counters
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+
+class Program:
+    """
+    A compiled Ente program. The bytecode stays in memory, and each run gets
+    memory of its own, so a Program can be run any number of times.
+    """
+
+    def __init__(self, bytecode: bytes):
+        self.bytecode = bytecode
+
+    def __len__(self):
+        return HEADER.unpack_from(self.bytecode)[3]
+
+    def run(
+        self,
+        stdout=None,
+        limits: Limits | None = None,
+        engine: Engine = Engine.REFERENCE,
+        count=False,
+    ) -> RunResult:
+        """
+        Runs the program, writing what it prints to stdout, or capturing it
+        into the result if stdout is None. count, or any limit on branches or
+        depth, runs it under a tracer that counts calls, branches and stores,
+        which the compiled engine does not support.
+        """
+        limits = limits if limits is not None else Limits()
+        stream = stdout if stdout is not None else io.StringIO()
+
+        output = _LimitedOutput(stream, limits.max_output)
+        tracer = None
+        if count or limits.max_branches is not None or limits.max_depth is not None:
+            tracer = _LimitedTracer(limits)
+
+        status, error = "ok", None
+        start = time.perf_counter()
+        try:
+            execute_buffer(self.bytecode, engine, tracer, output)
+        except LimitExceeded as e:
+            status, error = "limit", str(e)
+        except Exception as e:
+            status, error = "error", describe_error(e)
+        elapsed = time.perf_counter() - start
+
+        counters = {
+            "quadruples": len(self),
+            "output": output.written,
+            "elapsed": elapsed,
+        }
+        if tracer is not None:
+            counters.update(tracer.counters())
+
+        return RunResult(
+            status,
+            stream.getvalue() if stdout is None else None,
+            error,
+            counters,
+        )
+
+
+def compile_source(text: str, level: int = 1) -> Program:
+    """
+    Compiles Ente source text in this process, without touching the disk.
+    The parser's tables are built once per process and shared by every call.
+    Compile errors raise like they do for the run command.
+    """
+    return Program(compile_bytecode(text, level))
+
+
+class _LimitedOutput(OutputBuffer):
+    def __init__(self, stream, limit):
+        super().__init__(stream)
+        self.limit = limit
+
+    def write(self, value):
+        super().write(value)
+        if self.limit is not None and self.written > self.limit:
+            raise LimitExceeded(f"output exceeded {self.limit} characters")
+
+
+class _LimitedTracer(CountingTracer):
+    def __init__(self, limits: Limits):
+        super().__init__()
+        self.limits = limits
+
+    def on_call(self, ip, function, target):
+        super().on_call(ip, function, target)
+        if self.limits.max_depth is not None and self.depth > self.limits.max_depth:
+            raise LimitExceeded(f"calls nested deeper than {self.limits.max_depth}")
+
+    def on_branch(self, ip, target, taken):
+        super().on_branch(ip, target, taken)
+        if (
+            self.limits.max_branches is not None
+            and self.branches > self.limits.max_branches
+        ):
+            raise LimitExceeded(f"took more than {self.limits.max_branches} branches")
@@ -1,6 +1,11 @@
 from sly import Lexer
 
 
+def find_column(text, index):
+    """1-based column of the character at index in text."""
+    return index - text.rfind("\n", 0, index)
+
+
 class EnteLexer(Lexer):
     tokens = {
         # Identifiers and literals
@@ -94,5 +99,6 @@ class EnteLexer(Lexer):
         self.lineno += t.value.count("\n")
 
     def error(self, t):  # type: ignore
-        print(f"Line {self.lineno-1}: Bad character {t.value[0]}")
+        column = find_column(self.text, t.index)
+        print(f"Line {self.lineno}, column {column}: Bad character {t.value[0]}")
         self.index += 1
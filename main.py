@@ -1,12 +1,14 @@
+from contextlib import nullcontext
+from typing import Optional
 from typing_extensions import Annotated
 from pathlib import Path
+import time
 import typer
 
-from lexer import EnteLexer
-from memory import MemoryManager
-from parser import EnteParser
-from quadruples import Quadruple
-from vm import VirtualMachine
+from pipeline import compile_cached, compile_text, execute_bytecode
+from profiler import Profiler
+from tracer import PrintTracer
+from vm import Engine
 
 cli = typer.Typer(
     no_args_is_help=True,
@@ -18,62 +20,105 @@ cli = typer.Typer(
 TMP_PATH = "tmp/a.en"
 
 
-def build_bytecode(file):
+def build_bytecode(file, level=1, path=TMP_PATH):
     if not file.is_file():
         print("not a file")
         raise typer.Abort()
 
-    text = file.read_text()
-
-    lexer = EnteLexer()
-    parser = EnteParser()
-    parser.parse(lexer.tokenize(text))
-
-    constant_table, counter_table = parser.memory_assigner.output()
-    output = (counter_table, constant_table, parser.quadruples)
-
-    with open(TMP_PATH, "w") as bytecode:
-        for _, table in output[0].items():
-            for t, c in table.items():
-                if type(c) == dict:
-                    bytecode.write("~\n")
-                    bytecode.write(f"{t}\n")
-                    for t2, c2 in c.items():
-                        bytecode.write(f"{t2}|{c2}\n")
-                else:
-                    bytecode.write(f"{t}|{c}\n")
-
-        # Write constants section
-        bytecode.write(":\n")
-        for value, address in output[1].items():
-            bytecode.write(f"{address}|{value}\n")
-
-        # Write quadruples section
-        bytecode.write(":\n")
-        bytecode.write(str(output[2]))
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    compile_text(file.read_text(), path, level)
 
 
 @cli.command("run", help="Compile and execute a source file.")
-def run(file: Annotated[Path, typer.Argument(help="Path to the source file")]):
+def run(
+    file: Annotated[Path, typer.Argument(help="Path to the source file")],
+    level: Annotated[
+        int,
+        typer.Option(
+            "--optimize",
+            "-O",
+            help="Optimization level: 0 off, 1 peephole, 2 constants and loops",
+        ),
+    ] = 1,
+    engine: Annotated[
+        Engine, typer.Option(help="Execution engine for the virtual machine")
+    ] = Engine.REFERENCE,
+    trace: Annotated[
+        bool, typer.Option(help="Write call, branch and store events to stderr")
+    ] = False,
+    output: Annotated[
+        Optional[Path], typer.Option(help="Write program output to this file")
+    ] = None,
+    profile: Annotated[
+        bool,
+        typer.Option(help="Write a hot-spot report to stderr (reference engine)"),
+    ] = False,
+    collapsed: Annotated[
+        Optional[Path],
+        typer.Option(help="Write a flame graph collapsed-stack profile to this file"),
+    ] = None,
+):
+    if not file.is_file():
+        print("not a file")
+        raise typer.Abort()
+
+    # bytecode is cached by source, level and compiler, so an unchanged
+    # program skips straight to the virtual machine
     try:
-        build_bytecode(file)
+        path = compile_cached(file.read_text(), level)
     except Exception as e:
         raise Exception(f"could not compile file: {e}")
 
-    run_vm(TMP_PATH)
+    run_vm(path, engine, trace, output, profile, collapsed)
 
 
 @cli.command("compile", help="Compile a source file into bytecode.")
-def compile(file: Annotated[Path, typer.Argument(help="Path to the source file")]):
-    build_bytecode(file)
+def compile(
+    file: Annotated[Path, typer.Argument(help="Path to the source file")],
+    level: Annotated[
+        int,
+        typer.Option(
+            "--optimize",
+            "-O",
+            help="Optimization level: 0 off, 1 peephole, 2 constants and loops",
+        ),
+    ] = 1,
+):
+    build_bytecode(file, level)
 
 
 @cli.command("exec", help="Execute a bytecode file.")
-def execute(file: Annotated[Path, typer.Argument(help="Path to the bytecode file")]):
-    run_vm(file)
+def execute(
+    file: Annotated[Path, typer.Argument(help="Path to the bytecode file")],
+    engine: Annotated[
+        Engine, typer.Option(help="Execution engine for the virtual machine")
+    ] = Engine.REFERENCE,
+    trace: Annotated[
+        bool, typer.Option(help="Write call, branch and store events to stderr")
+    ] = False,
+    output: Annotated[
+        Optional[Path], typer.Option(help="Write program output to this file")
+    ] = None,
+    profile: Annotated[
+        bool,
+        typer.Option(help="Write a hot-spot report to stderr (reference engine)"),
+    ] = False,
+    collapsed: Annotated[
+        Optional[Path],
+        typer.Option(help="Write a flame graph collapsed-stack profile to this file"),
+    ] = None,
+):
+    run_vm(file, engine, trace, output, profile, collapsed)
 
 
-def run_vm(file):
+def run_vm(
+    file,
+    engine=Engine.REFERENCE,
+    trace=False,
+    output=None,
+    profile=False,
+    collapsed=None,
+):
     if isinstance(file, str):
         file = Path(file)
 
@@ -81,49 +126,78 @@ def run_vm(file):
         print("not a file")
         raise typer.Abort()
 
-    text = file.read_text()
-
-    memory_manager = MemoryManager()
-    vm = VirtualMachine(memory_manager)
-
-    line = text.splitlines()
-
-    idx = 0
-    while line[idx] != "~" and line[idx] != ":":
-        mem_type, size = line[idx].split("|")
-        memory_manager.describe(mem_type=mem_type, size=int(size))
-        idx += 1
-
-    while line[idx] != ":":
-        idx += 1
-        function = line[idx]
-        idx += 1
-        while not (line[idx] == "~" or line[idx] == ":"):
-            mem_type, size = line[idx].split("|")
-            memory_manager.describe(
-                mem_type=mem_type, size=int(size), function=function
-            )
-            idx += 1
-    idx += 1
+    # output is either a path to write program output to, or a stream
+    if isinstance(output, (str, Path)):
+        output_context = open(output, "w")
+    else:
+        output_context = nullcontext(output)
+
+    profiler = Profiler() if profile or collapsed is not None else None
+
+    with output_context as stream:
+        execute_bytecode(
+            file, engine, PrintTracer() if trace else None, stream, profiler
+        )
+
+    if profile:
+        profiler.report()
+    if collapsed is not None:
+        with open(collapsed, "w") as f:
+            profiler.collapsed(f)
+
+
+@cli.command("batch", help="Compile and run many source files in parallel.")
+def batch(
+    paths: Annotated[
+        list[str], typer.Argument(help="Source files, directories or glob patterns")
+    ],
+    level: Annotated[
+        int,
+        typer.Option(
+            "--optimize",
+            "-O",
+            help="Optimization level: 0 off, 1 peephole, 2 constants and loops",
+        ),
+    ] = 1,
+    engine: Annotated[
+        Engine, typer.Option(help="Execution engine for the virtual machine")
+    ] = Engine.REFERENCE,
+    jobs: Annotated[
+        Optional[int],
+        typer.Option("--jobs", "-j", help="Worker processes, one per core by default"),
+    ] = None,
+    show_output: Annotated[
+        bool, typer.Option(help="Print what each program printed after its status")
+    ] = False,
+):
+    from batch import collect_sources, run_batch
 
-    for key, value in memory_manager.descriptor["global"].items():
-        memory_manager.allocate(key, value)
+    sources = collect_sources(paths)
+    if not sources:
+        print("no source files found")
+        raise typer.Abort()
 
-    while line[idx] != ":":
-        address, value = line[idx].split("|")
-        memory_manager.assign(int(address), value)
-        idx += 1
+    start = time.perf_counter()
+    failed = 0
 
-    idx += 1
+    for result in run_batch(sources, level, engine, jobs):
+        status = "ok" if result.ok else f"{result.stage} error"
+        print(
+            f"{status:<13} compile {result.compile_time * 1000:8.1f}ms"
+            f"  run {result.run_time * 1000:8.1f}ms  {result.path}"
+        )
+        if not result.ok:
+            failed += 1
+            for line in result.error.splitlines():
+                print(f"    {line}")
+        if show_output and result.output:
+            print(result.output, end="")
 
-    quads = []
-    while idx < len(line):
-        operator, left_operand, right_operand, result = line[idx].split(" ")
-        q = Quadruple(int(operator), int(left_operand), int(right_operand), int(result))
-        quads.append(q)
-        idx += 1
+    elapsed = time.perf_counter() - start
+    print(f"{len(sources)} programs, {failed} failed, in {elapsed:.2f}s")
 
-    vm.execute(quads)
+    if failed:
+        raise typer.Exit(1)
 
 
 @cli.command(
@@ -132,6 +206,8 @@ def run_vm(file):
 def generate_ast(
     file: Annotated[Path, typer.Argument(help="Path to the source file")],
 ):
+    from lexer import EnteLexer
+    from parser import EnteParser
     from utils.ast_viz import draw_ast
 
     if not file.is_file():
@@ -142,7 +218,7 @@ def generate_ast(
 
     lexer = EnteLexer()
     parser = EnteParser()
-    res = parser.parse(lexer.tokenize(text))
+    res = parser.parse(lexer.tokenize(text), text)
 
     graph = draw_ast(res)
     output_filename = "tmp/ast_visualization"
@@ -1,5 +1,6 @@
-from stack import Stack
+from array import array
 
+from stack import Stack
 
 OFFSETS = {
     "g_void": 500,
@@ -16,10 +17,47 @@ OFFSETS = {
     "g_string": 11000,
 }
 
+# Every segment starts on a 1000 address boundary, except g_void which shares
+# the first block, so the block an address falls in names its segment.
+# g_string has no upper bound and owns every block from 11000 on.
+BLOCK_SIZE = 1000
+
+SEGMENTS = [None] * (max(OFFSETS.values()) // BLOCK_SIZE + 1)
+for mem_type, offset in OFFSETS.items():
+    SEGMENTS[offset // BLOCK_SIZE] = mem_type
+
+LOCAL_SEGMENTS = ("l_int", "l_float")
+
+
+def get_type(address):
+    try:
+        return SEGMENTS[address // BLOCK_SIZE]
+    except IndexError:
+        return "g_string"
+
+
+CASTS = {
+    "void": lambda _: None,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "string": str,
+}
+
+# Float segments are backed by typed arrays. Ints stay in a zeroed list, since
+# Ente ints are unbounded like Python's and array('q') would overflow past 64
+# bits. Booleans stay in a list too: array can't hold bool, and True/False are
+# shared objects anyway.
+TYPECODES = {
+    "float": "d",
+}
+
 
 class MemoryAssigner:
     def __init__(self):
+        # (mem_type, value) -> address, and the reverse for reading values back
         self.constants = {}
+        self.values = {}
         self.counter = {
             "global": {
                 "g_void": OFFSETS["g_void"],
@@ -38,16 +76,25 @@ class MemoryAssigner:
 
     def assign(self, mem_type, value=None):
         if value is not None:
-            if value not in self.constants.keys():
-                self.constants[value] = self.counter["global"][mem_type]
-            else:
-                return self.constants[value]
+            key = (mem_type, str(value))
+            if key in self.constants:
+                return self.constants[key]
+
+            self.constants[key] = self.counter["global"][mem_type]
+            self.values[self.constants[key]] = str(value)
 
         assigned_address = self.counter["global"][mem_type]
         self.counter["global"][mem_type] += 1
 
         return assigned_address
 
+    def constant(self, address):
+        """Typed value of the constant at address, or None if it isn't one."""
+        if address not in self.values:
+            return None
+
+        return CASTS[get_type(address).split("_")[1]](self.values[address])
+
     def assign_local(self, scope_name, data_type):
         if scope_name not in self.counter["local"]:
             self.counter["local"][scope_name] = {
@@ -70,13 +117,13 @@ class MemoryAssigner:
             for key2, _ in value.items():
                 counter_copy["local"][key][key2] -= OFFSETS[key2]
 
-        return self.constants, counter_copy
+        return self.values, counter_copy
 
     def display(self):
         constants, counter = self.output()
 
         print("Constant Table:")
-        for value, address in constants.items():
+        for address, value in constants.items():
             print(f"{address}: {value}")
 
         print("\nGlobal Counter Table:")
@@ -95,16 +142,24 @@ class MemorySegment:
         if mem_type not in OFFSETS.keys():
             raise ValueError(f"Invalid memory segment type: {mem_type}")
 
-        self.memory = [None] * size
+        data_type = mem_type.split("_")[1]
+
+        if data_type in TYPECODES:
+            self.memory = array(TYPECODES[data_type], [0]) * size
+        elif data_type == "int":
+            self.memory = [0] * size
+        else:
+            self.memory = [None] * size
         self.mem_type = mem_type
+        self.offset = OFFSETS[mem_type]
+        self.cast = CASTS[data_type]
 
     def access(self, address):
-        index = address - OFFSETS[self.mem_type]
+        index = address - self.offset
         return self.memory[index] if index < len(self.memory) else None
 
     def assign(self, address, value):
-        index = address - OFFSETS[self.mem_type]
-        self.memory[index] = value
+        self.memory[address - self.offset] = self.cast(value)
 
     def __str__(self):
         return f"{self.memory}"
@@ -132,19 +187,62 @@ class MemoryManager:
         }
         self.memory = Stack("memory")
 
+        # Activation records are pooled by function address and reused across
+        # calls, so their locals are not cleared between calls. ERA prepares
+        # the pending record, PARAM fills it and GOSUB pushes it.
+        self.frames = {}
+        self.pending = None
+        self.functions = Stack("functions")
+
+        # Backing arrays by segment code, address // BLOCK_SIZE. Global
+        # entries are fixed once allocated, and local ones are swapped to the
+        # active frame's on every call and return, so resolved slots index
+        # the current locals without decoding addresses.
+        self.segments = [None] * len(SEGMENTS)
+
     def allocate(self, mem_type, size=0):
+        segment = MemorySegment(mem_type, size)
         if not mem_type.startswith("l"):
             if len(self.memory) == 0:
                 self.memory.append({})
-            self.memory.items()[0][mem_type] = MemorySegment(mem_type, size)
+            self.memory.items()[0][mem_type] = segment
         else:
-            self.memory.items()[-1][mem_type] = MemorySegment(mem_type, size)
+            self.memory.items()[-1][mem_type] = segment
+        self.segments[OFFSETS[mem_type] // BLOCK_SIZE] = segment.memory
+
+    def allocate_local(self, function):
+        pool = self.frames.get(function)
 
-    def allocate_local(self):
-        self.memory.append({})
+        if pool:
+            frame = pool.pop()
+        else:
+            frame = {
+                mem_type: MemorySegment(mem_type, size)
+                for mem_type, size in self.descriptor["local"].get(function, {}).items()
+            }
+
+        self.pending = (function, frame)
+
+    def activate_local(self):
+        function, frame = self.pending
+        self.pending = None
+
+        self.functions.append(function)
+        self.memory.append(frame)
+        self.select_locals(frame)
 
     def deallocate_local(self):
-        self.memory.pop()
+        frame = self.memory.pop()
+        self.frames.setdefault(self.functions.pop(), []).append(frame)
+        self.select_locals(self.memory.peek() if len(self.memory) > 1 else {})
+
+    def select_locals(self, frame):
+        """Points the local entries of segments at frame's arrays."""
+        for mem_type in LOCAL_SEGMENTS:
+            segment = frame.get(mem_type)
+            self.segments[OFFSETS[mem_type] // BLOCK_SIZE] = (
+                segment.memory if segment is not None else None
+            )
 
     def describe(self, mem_type, size=0, function=None):
         if function is not None:
@@ -158,25 +256,10 @@ class MemoryManager:
         mem_type = self._get_type(address)
 
         if mem_type.startswith("l"):
-            value = (
-                self.memory.peek()[mem_type].access(address)
-                if self.memory.peek()[mem_type].access(address) is not None
-                else self.memory.peek(2)[mem_type].access(address)
-            )
+            value = self.memory.peek()[mem_type].access(address)
         else:
             value = self.memory.first()[mem_type].access(address)
 
-        if mem_type.endswith("void"):
-            return None
-        if mem_type.endswith("int"):
-            return int(value)
-        if mem_type.endswith("float"):
-            return float(value)
-        if mem_type.endswith("bool"):
-            return bool(value)
-        if mem_type.endswith("string"):
-            return str(value)
-
         return value
 
     def assign(self, address, value):
@@ -187,67 +270,26 @@ class MemoryManager:
         else:
             memory_to_access = self.memory.items()[0]
 
-        if mem_type.endswith("int"):
-            value = int(value)
-        if mem_type.endswith("float"):
-            value = float(value)
-        if mem_type.endswith("bool"):
-            value = bool(value)
-        if mem_type.endswith("string"):
-            value = str(value)
-
         memory_to_access[mem_type].assign(address, value)
 
-    def param(self, address):
+    def param(self, address, slot):
+        """Copies address, read in the caller, into slot of the pending frame."""
+        _, frame = self.pending
+        frame[self._get_type(slot)].assign(slot, self.access(address))
+
+    def resolve(self, address):
+        """
+        Decodes an address once into a (segment, index, cast) slot, whose value
+        is segments[segment][index]. Local segments follow the active frame.
+        """
         mem_type = self._get_type(address)
+        return (
+            OFFSETS[mem_type] // BLOCK_SIZE,
+            address - OFFSETS[mem_type],
+            CASTS[mem_type.split("_")[1]],
+        )
 
-        if mem_type.startswith("l"):
-            access_memory = self.memory.items()[-2]
-        else:
-            access_memory = self.memory.items()[0]
-
-        value = access_memory[mem_type].access(address)
-
-        index = 0
-        target_memory = self.memory.peek()
-
-        if mem_type.endswith("int"):
-            target_type = "l_int"
-        if mem_type.endswith("float"):
-            target_type = "l_float"
-
-        while (
-            target_memory[target_type].access(OFFSETS[target_type] + index) is not None
-        ):
-            index += 1
-
-        target_memory[target_type].assign(OFFSETS[target_type] + index, value)
-
-    def _get_type(self, address):
-        if address < OFFSETS["g_int"]:
-            return "g_void"
-        elif address < OFFSETS["g_float"]:
-            return "g_int"
-        elif address < OFFSETS["t_int"]:
-            return "g_float"
-        elif address < OFFSETS["t_float"]:
-            return "t_int"
-        elif address < OFFSETS["t_bool"]:
-            return "t_float"
-        elif address < OFFSETS["c_int"]:
-            return "t_bool"
-        elif address < OFFSETS["c_float"]:
-            return "c_int"
-        elif address < OFFSETS["c_string"]:
-            return "c_float"
-        elif address < OFFSETS["l_int"]:
-            return "c_string"
-        elif address < OFFSETS["l_float"]:
-            return "l_int"
-        elif address < OFFSETS["g_string"]:
-            return "l_float"
-        else:
-            return "g_string"
+    _get_type = staticmethod(get_type)
 
     def __str__(self):
         return str(self.memory)
@@ -1,4 +1,5 @@
 from enum import IntEnum
+from operator import add, eq, ge, gt, le, lt, mul, ne, sub, truediv
 
 
 class Operator(IntEnum):
@@ -21,6 +22,37 @@ class Operator(IntEnum):
     GREATER_EQUAL = 19
     EQUAL = 20
     NOT_EQUAL = 21
+    GOTOF_LESS_THAN = 22
+    GOTOF_GREATER_THAN = 23
+    GOTOF_LESS_EQUAL = 24
+    GOTOF_GREATER_EQUAL = 25
+    GOTOF_EQUAL = 26
+    GOTOF_NOT_EQUAL = 27
+
+
+OPERATIONS = {
+    Operator.SUBTRACT: sub,
+    Operator.ADD: add,
+    Operator.MULTIPLY: mul,
+    Operator.DIVIDE: truediv,
+    Operator.LESS_THAN: lt,
+    Operator.GREATER_THAN: gt,
+    Operator.LESS_EQUAL: le,
+    Operator.GREATER_EQUAL: ge,
+    Operator.EQUAL: eq,
+    Operator.NOT_EQUAL: ne,
+}
+
+# Compare-and-branch superinstructions, each fusing a comparison with the
+# GOTOF on its result: GOTOF_LESS_THAN a b L jumps to L unless a < b.
+BRANCHES = {
+    Operator.GOTOF_LESS_THAN: Operator.LESS_THAN,
+    Operator.GOTOF_GREATER_THAN: Operator.GREATER_THAN,
+    Operator.GOTOF_LESS_EQUAL: Operator.LESS_EQUAL,
+    Operator.GOTOF_GREATER_EQUAL: Operator.GREATER_EQUAL,
+    Operator.GOTOF_EQUAL: Operator.EQUAL,
+    Operator.GOTOF_NOT_EQUAL: Operator.NOT_EQUAL,
+}
 
 
 def perform_operation(
@@ -0,0 +1,495 @@
+from array import array
+from heapq import heappop, heappush
+
+from cfg import GOTOS, JUMPS, ControlFlowGraph, is_variable, operands, writes
+from memory import CASTS, OFFSETS, MemoryAssigner, get_type
+from operators import BRANCHES, OPERATIONS, Operator as Op
+from quadruples import QuadrupleManager
+
+
+def optimize(
+    quadruples: QuadrupleManager, memory_assigner: MemoryAssigner, level: int = 1
+):
+    """
+    Rewrites the quadruples in place. Level 0 leaves them as the parser
+    emitted them, level 1 runs the peephole pass, drops unreachable code and
+    dead stores, fuses compare-and-branch pairs and recycles temporaries,
+    and level 2 also propagates constants through straight-line code and
+    optimizes loops. New constants are interned through memory_assigner.
+    """
+    if level < 1:
+        return
+
+    quads = [
+        list(quadruples.code[i : i + 4]) for i in range(0, len(quadruples.code), 4)
+    ]
+    positions = list(zip(quadruples.lines, quadruples.columns))
+
+    thread_jumps(quads)
+    if level >= 2:
+        propagate_constants(quads, memory_assigner)
+    fold_temporary_assigns(quads)
+    if level >= 2:
+        optimize_loops(quads, positions, memory_assigner)
+    remove_unreachable(quads)
+    remove_dead_stores(quads)
+    fuse_branches(quads)
+    reuse_temporaries(quads, memory_assigner)
+
+    quadruples.code = compact(quads)
+
+    # passes that insert quadruples insert their positions along with them
+    kept = [i for i, quad in enumerate(quads) if quad is not None]
+    quadruples.lines = array("i", (positions[i][0] for i in kept))
+    quadruples.columns = array("i", (positions[i][1] for i in kept))
+
+
+def jump_targets(quads):
+    return {quad[3] for quad in quads if quad is not None and quad[0] in JUMPS}
+
+
+def thread_jumps(quads):
+    """Points jumps that land on a GOTO straight at that GOTO's target."""
+    for quad in quads:
+        if quad is None or quad[0] not in GOTOS:
+            continue
+
+        seen = set()
+        target = quad[3]
+        while (
+            target < len(quads)
+            and target not in seen
+            and quads[target] is not None
+            and quads[target][0] == Op.GOTO
+        ):
+            seen.add(target)
+            target = quads[target][3]
+
+        quad[3] = target
+
+
+def propagate_constants(quads, memory_assigner):
+    """
+    Within each basic block, replaces reads of an address last assigned a
+    constant with that constant, and evaluates numeric operations whose
+    operands are all constants into an assignment of the result.
+    """
+    leaders = jump_targets(quads)
+    known = {}
+
+    for i, quad in enumerate(quads):
+        if quad is None:
+            continue
+        if i in leaders:
+            known.clear()
+
+        operator = quad[0]
+        if operator in OPERATIONS:
+            quad[2] = known.get(quad[2], quad[2])
+        if operands(quad):
+            quad[1] = known.get(quad[1], quad[1])
+
+        if operator in OPERATIONS:
+            constant = fold(quad, memory_assigner)
+            if constant is not None:
+                quad[:] = [Op.ASSIGN, constant, -1, quad[3]]
+
+        if quad[0] == Op.ASSIGN and memory_assigner.constant(quad[1]) is not None:
+            known[quad[3]] = quad[1]
+        elif quad[0] == Op.ASSIGN or quad[0] in OPERATIONS:
+            known.pop(quad[3], None)
+        elif quad[0] in JUMPS or quad[0] == Op.ENDFUNC:
+            # a call may write any global, and the next block starts fresh
+            known.clear()
+
+
+def fold(quad, memory_assigner):
+    """Address of the constant a numeric quadruple evaluates to, if any."""
+    operator, left, right, result = quad
+
+    data_type = get_type(result).split("_")[1]
+    if data_type not in ("int", "float"):
+        return None
+
+    left = memory_assigner.constant(left)
+    right = memory_assigner.constant(right)
+    if left is None or right is None:
+        return None
+
+    try:
+        value = CASTS[data_type](OPERATIONS[operator](left, right))
+    except ZeroDivisionError:
+        return None
+
+    return memory_assigner.assign(f"c_{data_type}", value)
+
+
+def fold_temporary_assigns(quads):
+    """
+    Turns `t = a op b; x = t` into `x = a op b` when t is a temporary that is
+    read nowhere else and nothing jumps to the assignment.
+    """
+    uses = {}
+    for quad in quads:
+        if quad is not None:
+            for address in operands(quad):
+                uses[address] = uses.get(address, 0) + 1
+
+    targets = jump_targets(quads)
+
+    for i in range(len(quads) - 1):
+        quad, next_quad = quads[i], quads[i + 1]
+        if quad is None or next_quad is None or quad[0] not in OPERATIONS:
+            continue
+
+        temporary = quad[3]
+        if (
+            next_quad[0] == Op.ASSIGN
+            and next_quad[1] == temporary
+            and get_type(temporary).startswith("t_")
+            and uses.get(temporary) == 1
+            and i + 1 not in targets
+        ):
+            quad[3] = next_quad[3]
+            quads[i + 1] = None
+
+
+def remove_unreachable(quads):
+    """
+    Drops the basic blocks no path from the first one reaches, such as code
+    after an unconditional GOTO and functions that are never called, and
+    GOTOs to the quadruple right after them.
+    """
+    graph = ControlFlowGraph(quads)
+    reachable = graph.reachable()
+
+    for block in graph.blocks:
+        if block.start not in reachable:
+            quads[block.start : block.end] = [None] * (block.end - block.start)
+
+    for i, quad in enumerate(quads):
+        if quad is not None and quad[0] == Op.GOTO and quad[3] == i + 1:
+            quads[i] = None
+
+
+def remove_dead_stores(quads):
+    """
+    Drops assignments and operations whose result is never read before it
+    is overwritten or goes out of scope, until none are left. Divisions stay,
+    since they can fail.
+    """
+    changed = True
+    while changed:
+        changed = False
+        graph = ControlFlowGraph(quads)
+        graph.liveness()
+
+        for block in graph.blocks:
+            for i, quad, live in graph.transfer(block, set(block.live_out)):
+                if (
+                    writes(quad)
+                    and quad[0] != Op.DIVIDE
+                    and is_variable(quad[3])
+                    and quad[3] not in live
+                ):
+                    quads[i] = None
+                    changed = True
+
+
+def fuse_branches(quads):
+    """
+    Turns `t = a < b; GOTOF t L` into `GOTOF_LESS_THAN a b L`, and likewise
+    for the other comparisons, when t is read nowhere else and nothing jumps
+    to the GOTOF.
+    """
+    fused = {comparison: branch for branch, comparison in BRANCHES.items()}
+
+    uses = {}
+    for quad in quads:
+        if quad is not None:
+            for address in operands(quad):
+                uses[address] = uses.get(address, 0) + 1
+
+    targets = jump_targets(quads)
+
+    for i in range(len(quads) - 1):
+        quad, next_quad = quads[i], quads[i + 1]
+        if quad is None or next_quad is None or quad[0] not in fused:
+            continue
+
+        if (
+            next_quad[0] == Op.GOTOF
+            and next_quad[1] == quad[3]
+            and get_type(quad[3]).startswith("t_")
+            and uses.get(quad[3]) == 1
+            and i + 1 not in targets
+        ):
+            quads[i] = [fused[quad[0]], quad[1], quad[2], next_quad[3]]
+            quads[i + 1] = None
+
+
+def insert(quads, positions, index, new, past=()):
+    """
+    Inserts (quadruple, position) pairs before index and moves jump targets
+    after them. Jumps to index land on the first new quadruple, except the
+    ones at the indices in past, which land after the new quadruples.
+    """
+    for source, quad in enumerate(quads):
+        if quad is None or quad[0] not in JUMPS:
+            continue
+        if quad[3] > index or (quad[3] == index and source in past):
+            quad[3] += len(new)
+
+    quads[index:index] = [quad for quad, _ in new]
+    positions[index:index] = [position for _, position in new]
+
+
+def optimize_loops(quads, positions, memory_assigner):
+    """
+    Hoists invariant operations out of loops and strength-reduces products
+    of induction variables, innermost loops first so that invariants move
+    out through every level. Loops that call functions are left alone,
+    since the callee may write globals and shares the temporaries.
+    """
+    changed = True
+    while changed:
+        changed = False
+        for header, latch in ControlFlowGraph(quads).loops():
+            if any(
+                quad is not None and quad[0] == Op.GOSUB
+                for quad in quads[header : latch + 1]
+            ):
+                continue
+            if hoist_invariants(
+                quads, positions, header, latch, memory_assigner
+            ) or reduce_strength(quads, positions, header, latch, memory_assigner):
+                # indices after the loop moved, so start over
+                changed = True
+                break
+
+
+def hoist_invariants(quads, positions, header, latch, memory_assigner):
+    """
+    Moves operations on values the loop doesn't change into a preheader
+    that runs once before it. Only temporaries written once in the loop are
+    moved, so the loop's variables keep their values if it never runs.
+    Divisions only move when the divisor is a nonzero constant.
+    """
+    written = {}
+    for quad in quads[header : latch + 1]:
+        if quad is not None:
+            for address in writes(quad):
+                written[address] = written.get(address, 0) + 1
+
+    hoisted = []
+    changed = True
+    while changed:
+        changed = False
+        for i in range(header, latch + 1):
+            quad = quads[i]
+            if quad is None or quad[0] not in OPERATIONS:
+                continue
+
+            operator, left, right, result = quad
+            if (
+                get_type(result).startswith("t_")
+                and written[result] == 1
+                and not written.get(left)
+                and not written.get(right)
+                and (operator != Op.DIVIDE or memory_assigner.constant(right))
+            ):
+                hoisted.append((quad, positions[i]))
+                quads[i] = None
+                written[result] = 0
+                changed = True
+
+    if hoisted:
+        insert(quads, positions, header, hoisted, range(header, latch + 1))
+    return bool(hoisted)
+
+
+def reduce_strength(quads, positions, header, latch, memory_assigner):
+    """
+    Rewrites one `t = i * c` in the loop, where i only changes by `i = i + s`
+    or `i = i - s` and c and s are int constants, into `t = i * c` in the
+    preheader and `t = t + c * s` after each change of i. Only temporaries
+    read right after they are computed qualify, before i changes again.
+    """
+    reads = {}
+    for i, quad in enumerate(quads):
+        if quad is not None:
+            for address in operands(quad):
+                reads.setdefault(address, []).append(i)
+    targets = jump_targets(quads)
+
+    for i in range(header, latch + 1):
+        quad = quads[i]
+        if quad is None or quad[0] != Op.MULTIPLY or get_type(quad[3]) != "t_int":
+            continue
+
+        _, left, right, temporary = quad
+        if isinstance(memory_assigner.constant(left), int):
+            left, right = right, left
+        factor = memory_assigner.constant(right)
+        if not isinstance(factor, int) or get_type(left) not in ("g_int", "l_int"):
+            continue
+
+        steps = induction_steps(quads, header, latch, left, memory_assigner)
+        if not steps:
+            continue
+
+        def stale(read):
+            return any(
+                j in targets
+                or quads[j] is not None
+                and (quads[j][0] in JUMPS or left in writes(quads[j]))
+                for j in range(i + 1, read + 1)
+            )
+
+        uses = reads.get(temporary, [])
+        if not uses or any(read <= i or read > latch or stale(read) for read in uses):
+            continue
+
+        quads[i] = None
+        for index, step in sorted(steps, reverse=True):
+            increment = memory_assigner.assign("c_int", factor * step)
+            insert(
+                quads,
+                positions,
+                index + 1,
+                [([Op.ADD, temporary, increment, temporary], positions[index])],
+                range(len(quads)),
+            )
+
+        latch += len(steps)
+        insert(
+            quads, positions, header, [(quad, positions[i])], range(header, latch + 1)
+        )
+        return True
+
+    return False
+
+
+def induction_steps(quads, header, latch, address, memory_assigner):
+    """
+    (index, step) of every write to address in the loop, if each one adds
+    an int constant to it or subtracts one from it, or None.
+    """
+    steps = []
+    for i in range(header, latch + 1):
+        quad = quads[i]
+        if quad is None or address not in writes(quad):
+            continue
+
+        operator, left, right, _ = quad
+        if operator == Op.ADD and right == address:
+            left, right = right, left
+        step = memory_assigner.constant(right)
+        if (
+            operator not in (Op.ADD, Op.SUBTRACT)
+            or left != address
+            or not isinstance(step, int)
+        ):
+            return None
+        steps.append((i, step if operator == Op.ADD else -step))
+
+    return steps
+
+
+def compact(quads) -> array:
+    """
+    Packs the quadruples left after removals and remaps jump targets. A jump
+    to a removed quadruple lands on the next one that was kept.
+    """
+    new_index = [0] * (len(quads) + 1)
+    count = sum(quad is not None for quad in quads)
+
+    next_kept = count
+    for i in range(len(quads), -1, -1):
+        if i < len(quads) and quads[i] is not None:
+            next_kept -= 1
+        new_index[i] = next_kept
+
+    code = array("i")
+    for quad in quads:
+        if quad is None:
+            continue
+        if quad[0] in JUMPS:
+            quad = [*quad[:3], new_index[min(quad[3], len(quads))]]
+        code.extend(quad)
+
+    return code
+
+
+def reuse_temporaries(quads, memory_assigner):
+    """
+    Renumbers temporaries so that ones whose live ranges don't overlap share
+    a slot, then shrinks each t_* segment to the most temporaries live at
+    once. A range that reaches into a loop from before it is stretched to the
+    loop's back edge. A range that spans a call keeps a slot to itself, since
+    the callee's temporaries live in the same segments.
+    """
+    live = {}
+    for i, quad in enumerate(quads):
+        if quad is None:
+            continue
+        for address in (*operands(quad), *writes(quad)):
+            if get_type(address).startswith("t_"):
+                live.setdefault(address, [i, i])[1] = i
+
+    loops = [
+        (quad[3], i)
+        for i, quad in enumerate(quads)
+        if quad is not None and quad[0] in GOTOS and quad[3] <= i
+    ]
+    calls = [
+        i for i, quad in enumerate(quads) if quad is not None and quad[0] == Op.GOSUB
+    ]
+
+    changed = True
+    while changed:
+        changed = False
+        for head, back_edge in loops:
+            for interval in live.values():
+                if interval[0] < head <= interval[1] < back_edge:
+                    interval[1] = back_edge
+                    changed = True
+
+    renamed = {}
+    for mem_type in ("t_int", "t_float", "t_bool"):
+        intervals = sorted(
+            (start, end, address)
+            for address, (start, end) in live.items()
+            if get_type(address) == mem_type
+        )
+
+        free = []
+        active = []
+        size = 0
+
+        for start, end, address in intervals:
+            while active and active[0][0] <= start:
+                heappush(free, heappop(active)[1])
+
+            pinned = any(start < call < end for call in calls)
+            if free and not pinned:
+                slot = heappop(free)
+            else:
+                slot = size
+                size += 1
+
+            if not pinned:
+                heappush(active, (end, slot))
+            renamed[address] = OFFSETS[mem_type] + slot
+
+        memory_assigner.counter["global"][mem_type] = OFFSETS[mem_type] + size
+
+    for quad in quads:
+        if quad is None:
+            continue
+        if operands(quad):
+            quad[1] = renamed.get(quad[1], quad[1])
+        if quad[0] in OPERATIONS or quad[0] in BRANCHES:
+            quad[2] = renamed.get(quad[2], quad[2])
+        if writes(quad):
+            quad[3] = renamed.get(quad[3], quad[3])
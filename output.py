@@ -0,0 +1,34 @@
+import sys
+
+
+class OutputBuffer:
+    """
+    Collects what PRINT writes and hands it to stream in chunks of roughly
+    size characters, instead of going through print once per value. Anything
+    still buffered is written on flush, which the virtual machine calls when
+    a program stops.
+    """
+
+    def __init__(self, stream=None, size=8192):
+        self.stream = stream if stream is not None else sys.stdout
+        self.size = size
+        self.chunks = []
+        self.pending = 0
+        self.written = 0
+
+    def write(self, value):
+        text = f"{value}\n"
+        self.chunks.append(text)
+        self.pending += len(text)
+        self.written += len(text)
+
+        if self.pending >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            self.stream.write("".join(self.chunks))
+            self.chunks.clear()
+            self.pending = 0
+
+        self.stream.flush()
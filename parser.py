@@ -1,12 +1,15 @@
 import logging
+import os
 from sly import Parser
-from lexer import EnteLexer
+from sly.yacc import YaccError
+from cache import load_parse_tables
+from lexer import EnteLexer, find_column
 from memory import MemoryAssigner
-from operators import Operator as Op
+from operators import OPERATIONS, Operator as Op
 
-from symbol_table import SymbolTable, Symbol
+from symbol_table import Kind, ScopedSymbolTable, SymbolTable, Symbol
 from quadruples import QuadrupleManager
-from semantics import validate_semantics
+from semantics import DataType, validate_semantics
 from stack import Stack
 
 
@@ -18,17 +21,51 @@ class EnteParser(Parser):
         ("left", MULTIPLY, DIVIDE),  # type: ignore
     )
 
-    debugfile = "parser.out"
+    # set ENTE_PARSER_DEBUG to a path to dump the grammar and LALR states
+    debugfile = os.environ.get("ENTE_PARSER_DEBUG")
     log = logging.getLogger()
     log.setLevel(logging.ERROR)
 
-    def __init__(self):
+    @classmethod
+    def _build(cls, definitions):
+        """
+        Parser._build, except that the LALR tables come from the parse-table
+        cache unless the grammar changed. Parser._build skips classes that
+        define their own, so this runs its steps directly.
+        """
+        rules = [
+            (name, value)
+            for name, value in definitions
+            if callable(value) and hasattr(value, "rules")
+        ]
+
+        if not cls._Parser__validate_specification():
+            raise YaccError("Invalid parser specification")
+
+        cls._Parser__build_grammar(rules)
+
+        if not cls.debugfile:
+            cls._lrtable = load_parse_tables(cls._grammar)
+            return
+
+        cls._Parser__build_lrtables()
+        with open(cls.debugfile, "w") as f:
+            f.write(str(cls._grammar))
+            f.write("\n")
+            f.write(str(cls._lrtable))
+
+    def __init__(self, fold_constants=True):
         super().__init__()
 
+        self.fold_constants = fold_constants
+
+        # functions, and the program, by name; variables of the open scopes
         self.scope_table = SymbolTable()
+        self.symbols = ScopedSymbolTable()
         self.memory_assigner = MemoryAssigner()
 
-        # Stacks for symbol table building
+        # Stacks for symbol table building, scope holds the program's or the
+        # current function's symbol
         self.scope = Stack("scope")
         self.variables = Stack("variables")
 
@@ -40,6 +77,27 @@ class EnteParser(Parser):
         self.operators = Stack("operators")
         self.jumps = Stack("jumps")
 
+        # Stack of [function symbol, argument count] for calls being parsed
+        self.calls = Stack("calls")
+
+    def parse(self, tokens, text=None):
+        """
+        Parses tokens, tagging every quadruple with the line and column of the
+        last token read when it was emitted. Columns need the source text.
+        Errors raised while parsing are reported at that position.
+        """
+        try:
+            return super().parse(self.track(tokens, text))
+        except Exception as e:
+            line, column = self.quadruples.position
+            raise Exception(f"line {line}, column {column}: {e}") from e
+
+    def track(self, tokens, text):
+        for token in tokens:
+            column = find_column(text, token.index) if text is not None else 0
+            self.quadruples.position = (token.lineno, column)
+            yield token
+
     ########
     # Root #
     ########
@@ -56,11 +114,10 @@ class EnteParser(Parser):
         # we'll later fill in where it has to jump to start main
         self.quadruples.add(Op.GOTO, -1, -1, -1)
 
-        # global scope symbol table contains a child symbol table for storing it's functions and variables
-        self.scope_table.declare(
-            Symbol(data_type="table.global", name=p[0], child=SymbolTable())
-        )
-        self.scope.append(p[0])
+        program = Symbol(kind=Kind.PROGRAM, name=p[0])
+        self.scope_table.declare(program)
+        self.scope.append(program)
+        self.symbols.enter()
         self.jumps.append(self.quadruples.current_index())
 
         return p[0]
@@ -76,21 +133,12 @@ class EnteParser(Parser):
     # Variables #
     #############
     @_(  # type: ignore
-        "VAR in_vars vars_declare",
+        "VAR vars_declare",
         "empty",
     )
     def vars(self, p):
         return p
 
-    @_("")  # type: ignore
-    def in_vars(self, _):
-        curr_scope = self.scope.peek() if not self.scope.is_empty() else "global"
-        curr_scope_table = self.scope_table.lookup(curr_scope)
-        if not curr_scope_table.child:
-            # init symbol table for scope
-            curr_scope_table.child = SymbolTable()
-            self.scope_table.update(curr_scope_table)
-
     @_(  # type: ignore
         "var_list COLON var_type SEMICOLON",
         "var_list COLON var_type SEMICOLON vars",
@@ -107,20 +155,23 @@ class EnteParser(Parser):
     @_("INT", "FLOAT", "STRING")  # type: ignore
     def var_type(self, p):
         curr_scope = self.scope.peek()
-        curr_scope_table = self.scope_table.lookup(curr_scope)
 
         for var in self.variables:
             if len(self.scope) > 1:
                 # if not global scope
                 mem_addr = self.memory_assigner.assign_local(
-                    curr_scope_table.address, f"l_{p[0]}"
+                    curr_scope.address, f"l_{p[0]}"
                 )
             else:
                 mem_addr = self.memory_assigner.assign(f"g_{p[0]}")
 
-            var_symbol = Symbol(name=var, data_type=f"var.{p[0]}", address=mem_addr)
-            curr_scope_table.child.declare(var_symbol)
-            self.scope_table.update(curr_scope_table)
+            var_symbol = Symbol(
+                name=var,
+                data_type=DataType[p[0].upper()],
+                kind=Kind.VARIABLE,
+                address=mem_addr,
+            )
+            self.symbols.declare(var_symbol)
 
         self.variables.clear()
 
@@ -130,7 +181,7 @@ class EnteParser(Parser):
     # Functions #
     #############
     @_(  # type: ignore
-        "VOID ID seen_func_id LPAREN params RPAREN LBRACE block RBRACE seen_func SEMICOLON",
+        "VOID ID seen_func_id LPAREN func_params RPAREN LBRACE block RBRACE seen_func SEMICOLON funcs",
         "empty",
     )
     def funcs(self, p):
@@ -139,32 +190,42 @@ class EnteParser(Parser):
     @_("")  # type: ignore
     def seen_func(self, _):
         self.quadruples.add(Op.ENDFUNC, -1, -1, -1)
+        self.symbols.exit()
         self.scope.pop()
 
     @_("")  # type: ignore
     def seen_func_id(self, p):
         mem_addr = self.memory_assigner.assign("g_void")
-        self.scope_table.declare(
-            Symbol(
-                data_type="table.local",
-                name=p[-1],
-                child=SymbolTable(),
-                address=mem_addr,
-            )
+        func_symbol = Symbol(
+            kind=Kind.FUNCTION,
+            name=p[-1],
+            address=mem_addr,
+            index=self.quadruples.current_index() + 1,
         )
-        self.scope.append(p[-1])
+        self.scope_table.declare(func_symbol)
+        self.scope.append(func_symbol)
+        self.symbols.enter()
+
+    @_("params", "empty")  # type: ignore
+    def func_params(self, p):
+        return p
 
     @_("ID COLON param_type", "ID COLON param_type COMMA params")  # type: ignore
     def params(self, p):
         curr_scope = self.scope.peek()
-        mem_addr = self.memory_assigner.assign_local(curr_scope, f"l_{p[2]}")
 
-        param_symbol = Symbol(name=p[0], data_type=f"param.{p[2]}", address=mem_addr)
+        mem_addr = self.memory_assigner.assign_local(curr_scope.address, f"l_{p[2]}")
 
-        curr_scope_table = self.scope_table.lookup(curr_scope)
-        curr_scope_table.child.declare(param_symbol)
+        param_symbol = Symbol(
+            name=p[0],
+            data_type=DataType[p[2].upper()],
+            kind=Kind.PARAMETER,
+            address=mem_addr,
+        )
+        self.symbols.declare(param_symbol)
 
-        self.scope_table.update(curr_scope_table)
+        # params reduce right to left, so this one goes before the ones seen so far
+        curr_scope.params.insert(0, param_symbol)
 
         return p
 
@@ -204,11 +265,68 @@ class EnteParser(Parser):
         "condition",
         "loop",
         "do_while",
+        "call",
         "LBRACE block RBRACE",
     )
     def statement(self, p):
         return p[0]
 
+    #########
+    # Calls #
+    #########
+    @_("ID LPAREN seen_call args RPAREN")  # type: ignore
+    def call(self, p):
+        func_symbol, arg_count = self.calls.pop()
+
+        if arg_count != len(func_symbol.params):
+            raise Exception(
+                f"{func_symbol.name} expects {len(func_symbol.params)} arguments, got {arg_count}"
+            )
+
+        self.quadruples.add(Op.GOSUB, -1, -1, func_symbol.index)
+        return p
+
+    @_("")  # type: ignore
+    def seen_call(self, p):
+        func_symbol = self.scope_table.lookup(p[-2])
+        if func_symbol.kind != Kind.FUNCTION:
+            raise Exception(f"Symbol {p[-2]} is not a function")
+
+        self.quadruples.add(Op.ERA, -1, -1, func_symbol.address)
+        self.calls.append([func_symbol, 0])
+
+    @_("arg_list", "empty")  # type: ignore
+    def args(self, p):
+        return p
+
+    @_("expression seen_arg", "expression seen_arg COMMA arg_list")  # type: ignore
+    def arg_list(self, p):
+        return p
+
+    @_("")  # type: ignore
+    def seen_arg(self, _):
+        call = self.calls.peek()
+        func_symbol, arg_count = call
+
+        if arg_count >= len(func_symbol.params):
+            raise Exception(
+                f"{func_symbol.name} expects {len(func_symbol.params)} arguments"
+            )
+
+        param_symbol = func_symbol.params[arg_count]
+        arg = self.operands.pop()
+        arg_type = self.operand_types.pop()
+
+        result_type = validate_semantics(param_symbol.data_type, arg_type, Op.ASSIGN)
+        if result_type == DataType.ERROR:
+            raise Exception(
+                f"type mismatch: {param_symbol.name} {Op.ASSIGN} {arg_type}"
+            )
+
+        # PARAM writes straight into the parameter's slot in the callee frame
+        self.quadruples.add(Op.PARAM, arg, -1, param_symbol.address)
+        call[1] += 1
+
     @_("ID ASSIGN in_assign expression")  # type: ignore
     def assign(self, p):
         if not self.operators.is_empty() and self.operators.peek() == Op.ASSIGN:
@@ -221,7 +339,7 @@ class EnteParser(Parser):
             assignee_type = self.operand_types.pop()
 
             result_type = validate_semantics(assignee_type, operand_type, operator)
-            if result_type == "error":
+            if result_type == DataType.ERROR:
                 raise Exception(f"type mismatch: {assignee} {operator} {operand_type}")
 
             self.quadruples.add(operator, operand, -1, assignee)
@@ -233,15 +351,9 @@ class EnteParser(Parser):
 
     @_("")  # type: ignore
     def in_assign(self, p):
-        id_symbol = Symbol()
-        for scope in reversed(self.scope):
-            scope_symbols = self.scope_table.lookup(scope).child
-            if scope_symbols.lookup(p[-2]):
-                id_symbol = scope_symbols.lookup(p[-2])
-                break
-
-        if not id_symbol:
-            raise Exception(f"Symbol {p[-2]} is undeclared")
+        id_symbol = self.symbols.lookup(p[-2])
+        if id_symbol is None:
+            raise Exception(f"Symbol {p[-2]} is undeclared.")
 
         self.operators.append(Op.ASSIGN)
         self.operands.append(id_symbol.address)
@@ -263,7 +375,7 @@ class EnteParser(Parser):
     def seen_condition(self, _):
         expression_type = self.operand_types.pop()
 
-        if expression_type != "bool":
+        if expression_type != DataType.BOOL:
             raise Exception("Cycle expression must be of type bool")
         expression_result = self.operands.pop()
         self.quadruples.add(Op.GOTOF, expression_result, -1, -1)
@@ -277,11 +389,9 @@ class EnteParser(Parser):
 
     @_("IF LPAREN expression RPAREN seen_condition LBRACE block RBRACE optional_else")  # type: ignore
     def condition(self, p):
+        # either the GOTOF past the if block or, with an else, the GOTO past it
         end = self.jumps.pop()
-        self.quadruples.fill(end, self.quadruples.current_index())
-        if self.jumps:
-            final_jump = self.jumps.pop()
-            self.quadruples.fill(final_jump, self.quadruples.current_index())
+        self.quadruples.fill(end, self.quadruples.current_index() + 1)
         return p
 
     @_("ELSE seen_else LBRACE block RBRACE", "empty")  # type: ignore
@@ -319,19 +429,40 @@ class EnteParser(Parser):
 
             # validate semantics here
             result_type = validate_semantics(left_type, right_type, operator)
-            if result_type == "error":
+            if result_type == DataType.ERROR:
                 raise Exception(
                     f"type mismatch: {left_operand} {operator} {right_type}"
                 )
 
-            result_addr = self.memory_assigner.assign(f"t_{result_type}")
-
-            self.quadruples.add(operator, left_operand, right_operand, result_addr)
+            result_addr = self.fold(operator, left_operand, right_operand, result_type)
+            if result_addr is None:
+                result_addr = self.memory_assigner.assign(f"t_{result_type}")
+                self.quadruples.add(operator, left_operand, right_operand, result_addr)
 
             self.operands.append(result_addr)
             self.operand_types.append(result_type)
         return p
 
+    def fold(self, operator, left_operand, right_operand, result_type):
+        """
+        Evaluates a numeric operation on two constants at compile time and
+        returns the address of the interned result, or None if it has to run.
+        """
+        if not self.fold_constants or result_type not in (DataType.INT, DataType.FLOAT):
+            return None
+
+        left = self.memory_assigner.constant(left_operand)
+        right = self.memory_assigner.constant(right_operand)
+        if left is None or right is None:
+            return None
+
+        try:
+            value = OPERATIONS[operator](left, right)
+        except ZeroDivisionError:
+            return None
+
+        return self.memory_assigner.assign(f"c_{result_type}", value)
+
     @_("term exp_operator")  # type: ignore
     def exp(self, p):
         if not self.operators.is_empty() and self.operators.peek() in [
@@ -348,14 +479,15 @@ class EnteParser(Parser):
 
             # validate semantics here
             result_type = validate_semantics(left_type, right_type, operator)
-            if result_type == "error":
+            if result_type == DataType.ERROR:
                 raise Exception(
                     f"type mismatch: {left_operand} {operator} {right_type}"
                 )
 
-            result_addr = self.memory_assigner.assign(f"t_{result_type}")
-
-            self.quadruples.add(operator, left_operand, right_operand, result_addr)
+            result_addr = self.fold(operator, left_operand, right_operand, result_type)
+            if result_addr is None:
+                result_addr = self.memory_assigner.assign(f"t_{result_type}")
+                self.quadruples.add(operator, left_operand, right_operand, result_addr)
 
             self.operands.append(result_addr)
             self.operand_types.append(result_type)
@@ -381,14 +513,15 @@ class EnteParser(Parser):
 
             # validate semantics here
             result_type = validate_semantics(left_type, right_type, operator)
-            if result_type == "error":
+            if result_type == DataType.ERROR:
                 raise Exception(
                     f"type mismatch: {left_operand} {operator} {right_type}"
                 )
 
-            result_addr = self.memory_assigner.assign(f"t_{result_type}")
-
-            self.quadruples.add(operator, left_operand, right_operand, result_addr)
+            result_addr = self.fold(operator, left_operand, right_operand, result_type)
+            if result_addr is None:
+                result_addr = self.memory_assigner.assign(f"t_{result_type}")
+                self.quadruples.add(operator, left_operand, right_operand, result_addr)
 
             self.operands.append(result_addr)
             self.operand_types.append(result_type)
@@ -442,34 +575,28 @@ class EnteParser(Parser):
     def const_int(self, p):
         addr = self.memory_assigner.assign("c_int", p[0])
         self.operands.append(addr)
-        self.operand_types.append("int")
+        self.operand_types.append(DataType.INT)
         return p
 
     @_("FLOAT_NUMBER")  # type: ignore
     def const_float(self, p):
         addr = self.memory_assigner.assign("c_float", p[0])
         self.operands.append(addr)
-        self.operand_types.append("float")
+        self.operand_types.append(DataType.FLOAT)
         return p
 
     @_("STRING_CONSTANT")  # type: ignore
     def const_string(self, p):
         addr = self.memory_assigner.assign("c_string", p[0])
         self.operands.append(addr)
-        self.operand_types.append("string")
+        self.operand_types.append(DataType.STRING)
         return p
 
     @_("ID")  # type: ignore
     def const_id(self, p):
-        id_symbol = Symbol()
-        for scope in reversed(self.scope):
-            scope_symbols = self.scope_table.lookup(scope).child
-            if scope_symbols.lookup(p[0]):
-                id_symbol = scope_symbols.lookup(p[0])
-                break
-
-        if not id_symbol:
-            raise Exception(f"Symbol {p[0]} is undeclared")
+        id_symbol = self.symbols.lookup(p[0])
+        if id_symbol is None:
+            raise Exception(f"Symbol {p[0]} is undeclared.")
 
         self.operands.append(id_symbol.address)
         self.operand_types.append(id_symbol.data_type)
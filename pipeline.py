@@ -0,0 +1,98 @@
+import mmap
+import os
+from pathlib import Path
+
+from bytecode import encode_bytecode, load_bytecode
+from cache import bytecode_path, evict_bytecode, write_atomic
+from memory import MemoryManager
+from output import OutputBuffer
+from vm import Engine, VirtualMachine
+
+
+def compile_text(text, path, level=1):
+    """Compiles Ente source text into a bytecode file at path."""
+    with open(path, "wb") as f:
+        f.write(compile_bytecode(text, level))
+
+
+def compile_bytecode(text, level=1) -> bytes:
+    """Compiles Ente source text into bytecode, kept in memory."""
+    # the front end is imported here so that exec never builds the parser
+    from lexer import EnteLexer
+    from optimizer import optimize
+    from parser import EnteParser
+
+    lexer = EnteLexer()
+    parser = EnteParser(fold_constants=level > 0)
+    parser.parse(lexer.tokenize(text), text)
+    optimize(parser.quadruples, parser.memory_assigner, level)
+
+    constant_table, counter_table = parser.memory_assigner.output()
+    quadruples = parser.quadruples
+    return encode_bytecode(
+        counter_table,
+        constant_table,
+        quadruples.code,
+        (quadruples.lines, quadruples.columns),
+    )
+
+
+def compile_cached(text, level=1) -> Path:
+    """
+    Returns the path of the bytecode for text, compiling it into the cache
+    first unless the same source was compiled at the same level before.
+    """
+    path = bytecode_path(text, level)
+
+    # touch it to mark it recently used; if it is missing, never compiled or
+    # evicted by a concurrent run, compile it again
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    data = compile_bytecode(text, level)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, data)
+    evict_bytecode()
+    return path
+
+
+def execute_bytecode(
+    path, engine=Engine.REFERENCE, tracer=None, stream=None, profiler=None
+):
+    """Runs the bytecode file at path in fresh memory, printing to stream."""
+    path = Path(path)
+
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        # the compiled engine caches its generated code next to the bytecode
+        execute_buffer(
+            buffer,
+            engine,
+            tracer,
+            OutputBuffer(stream),
+            path.with_suffix(".enc"),
+            profiler,
+        )
+
+
+def execute_buffer(
+    buffer, engine=Engine.REFERENCE, tracer=None, output=None, cache=None, profiler=None
+):
+    """Runs bytecode held in buffer, such as bytes or an mmap, in fresh memory."""
+    memory_manager = MemoryManager()
+    vm = VirtualMachine(memory_manager, tracer, output, profiler)
+
+    code, lines = load_bytecode(buffer, memory_manager)
+    try:
+        vm.run(code, engine, cache, lines)
+    finally:
+        code.release()
+
+
+def describe_error(error) -> str:
+    """An error's message along with the notes saying where it was raised."""
+    return "\n".join([str(error), *getattr(error, "__notes__", ())])
@@ -0,0 +1,161 @@
+import sys
+import time
+from collections import defaultdict
+
+from operators import Operator
+
+
+class Profiler:
+    """
+    Counts and times every quadruple the reference engine runs. The time
+    between two steps is charged to the first one, and to the stack of
+    functions it ran in, so totals cover the whole run. Functions are named
+    after their g_void address, as set by the ERA before each call. With a
+    line table, quadruples are also reported by source line.
+    """
+
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+
+        self.counts = defaultdict(int)
+        self.times = defaultdict(int)
+        self.operators = {}
+        self.calls = defaultdict(int)
+        self.stacks = defaultdict(int)
+
+        self.lines = None
+
+        self.stack = ["main"]
+        self.pending = None
+        self.last = None
+        self.started = None
+
+    def step(self, ip, quadruple):
+        now = self.clock()
+        self.charge(now)
+
+        operator = Operator(quadruple.operator)
+        self.counts[ip] += 1
+        self.operators[ip] = operator
+        self.last = (ip, (*self.stack, operator.name))
+        self.started = now
+
+        # a call's own quadruples belong to the caller, and its ENDFUNC to
+        # the callee, so the stack changes after they are charged
+        match operator:
+            case Operator.ERA:
+                self.pending = quadruple.result
+            case Operator.GOSUB:
+                self.calls[self.pending] += 1
+                self.stack.append(f"function {self.pending}")
+            case Operator.ENDFUNC:
+                self.stack.pop()
+
+    def stop(self):
+        self.charge(self.clock())
+        self.last = None
+
+    def charge(self, now):
+        if self.last is None:
+            return
+
+        ip, stack = self.last
+        elapsed = now - self.started
+        self.times[ip] += elapsed
+        self.stacks[stack] += elapsed
+
+    def by_operator(self) -> dict:
+        """Operator name to (count, nanoseconds)."""
+        totals = defaultdict(lambda: [0, 0])
+        for ip, operator in self.operators.items():
+            totals[operator.name][0] += self.counts[ip]
+            totals[operator.name][1] += self.times[ip]
+        return {name: tuple(total) for name, total in totals.items()}
+
+    def by_line(self) -> dict:
+        """Source line to (count, nanoseconds), given a line table."""
+        totals = defaultdict(lambda: [0, 0])
+        for ip in self.operators:
+            line, _ = self.lines[ip]
+            totals[line][0] += self.counts[ip]
+            totals[line][1] += self.times[ip]
+        return {line: tuple(total) for line, total in totals.items()}
+
+    def by_function(self) -> dict:
+        """Function name to (calls, own nanoseconds, nanoseconds with callees)."""
+        totals = defaultdict(lambda: [0, 0, 0])
+
+        for stack, elapsed in self.stacks.items():
+            functions = stack[:-1]
+            totals[functions[-1]][1] += elapsed
+            for function in set(functions):
+                totals[function][2] += elapsed
+
+        for function, calls in self.calls.items():
+            totals[f"function {function}"][0] += calls
+        totals["main"][0] = 1
+
+        return {name: tuple(total) for name, total in totals.items()}
+
+    def report(self, stream=None, top=15):
+        """Writes the hottest quadruples, operators and functions."""
+        stream = stream if stream is not None else sys.stderr
+        total = sum(self.times.values()) or 1
+
+        def line(label, count, elapsed, *extra):
+            print(
+                f"{label:<24} {count:>10} {elapsed / 1e6:>10.3f}ms"
+                f" {elapsed / total:>7.1%}{''.join(extra)}",
+                file=stream,
+            )
+
+        print(f"{'quadruple':<24} {'count':>10} {'time':>12} {'share':>7}", file=stream)
+        hottest = sorted(self.times, key=self.times.get, reverse=True)[:top]
+        for ip in hottest:
+            source = ""
+            if self.lines is not None:
+                source = " line {}:{}".format(*self.lines[ip])
+            line(
+                f"{ip:>5} {self.operators[ip].name}",
+                self.counts[ip],
+                self.times[ip],
+                source,
+            )
+
+        if self.lines is not None:
+            print(
+                f"\n{'line':<24} {'count':>10} {'time':>12} {'share':>7}", file=stream
+            )
+            lines = self.by_line()
+            for number in sorted(
+                lines, key=lambda number: lines[number][1], reverse=True
+            )[:top]:
+                line(f"line {number}", *lines[number])
+
+        print(
+            f"\n{'operator':<24} {'count':>10} {'time':>12} {'share':>7}", file=stream
+        )
+        operators = self.by_operator()
+        for name in sorted(
+            operators, key=lambda name: operators[name][1], reverse=True
+        ):
+            line(name, *operators[name])
+
+        print(
+            f"\n{'function':<24} {'calls':>10} {'self':>12} {'share':>7} {'total':>12}",
+            file=stream,
+        )
+        functions = self.by_function()
+        for name in sorted(
+            functions, key=lambda name: functions[name][1], reverse=True
+        ):
+            calls, own, inclusive = functions[name]
+            line(name, calls, own, f" {inclusive / 1e6:>10.3f}ms")
+
+    def collapsed(self, stream):
+        """
+        Writes one "main;function 501;ADD 1234" line per stack and operator,
+        weighted in microseconds, as flame graph tools read them.
+        """
+        for stack, elapsed in sorted(self.stacks.items()):
+            stream.write(f"{';'.join(stack)} {elapsed // 1000}\n")
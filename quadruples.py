@@ -1,4 +1,9 @@
+from array import array
+
+
 class Quadruple:
+    __slots__ = ("operator", "left_operand", "right_operand", "result")
+
     def __init__(self, operator, left_operand, right_operand, result):
         self.operator = operator
         self.left_operand = left_operand
@@ -13,24 +18,51 @@ class Quadruple:
 
 
 class QuadrupleManager:
+    """
+    Stores quadruples interleaved in a single int array, 4 ints per quadruple
+    (operator, left operand, right operand, result). The array is the same
+    flat bytecode the virtual machine runs and the bytecode file stores.
+    lines and columns hold the source position each quadruple came from, as
+    set in position by the parser when it emitted it.
+    """
+
     def __init__(self) -> None:
-        self.quadruples: list[Quadruple] = []
+        self.code = array("i")
+        self.lines = array("i")
+        self.columns = array("i")
+        self.position = (0, 0)
 
     def add(self, operator, left_operand, right_operand, result):
-        q = Quadruple(operator, left_operand, right_operand, result)
-        self.quadruples.append(q)
+        self.code.extend((operator, left_operand, right_operand, result))
+        self.lines.append(self.position[0])
+        self.columns.append(self.position[1])
 
     def current_index(self) -> int:
-        return len(self.quadruples) - 1
+        return len(self.code) // 4 - 1
 
     def fill(self, index, value):
-        self.quadruples[index].result = value
+        self.code[index * 4 + 3] = value
+
+    def __len__(self) -> int:
+        return len(self.code) // 4
+
+    def __getitem__(self, index) -> Quadruple:
+        if index < 0:
+            index += len(self)
+        return Quadruple(*self.code[index * 4 : index * 4 + 4])
+
+    def __iter__(self):
+        return iter(unpack(self.code))
 
     def __str__(self) -> str:
         res = []
-        for q in self.quadruples:
+        for q in self:
             res.append(str(q))
         return "\n".join(res)
 
     def __repr__(self) -> str:
         return str(self)
+
+
+def unpack(code) -> list[Quadruple]:
+    return [Quadruple(*code[i : i + 4]) for i in range(0, len(code), 4)]
@@ -1,9 +1,10 @@
-from operators import Operator
+from enum import IntEnum
 
+from operators import Operator
 
 SEMANTIC_CUBE = {
     "string": {
-        "string": {"=": "string,"},
+        "string": {"=": "string"},
     },
     "int": {
         "int": {
@@ -144,21 +145,45 @@ OPERATOR_MAPPING = {
 }
 
 
-def validate_semantics(left_operand_type, right_operand_type, operator) -> str:
-    left_operand_type = left_operand_type.split(".")[-1]
-    right_operand_type = right_operand_type.split(".")[-1]
+class DataType(IntEnum):
+    """
+    Types the parser tracks operands by, as small integer codes. ERROR is
+    the result of an operation the types don't support.
+    """
+
+    INT = 0
+    FLOAT = 1
+    BOOL = 2
+    STRING = 3
+    ERROR = 4
+
+    def __str__(self):
+        return self.name.lower()
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+
+TYPE_COUNT = len(DataType)
+OPERATOR_COUNT = max(Operator) + 1
+
+# SEMANTIC_CUBE flattened into a list indexed by left type, right type and
+# operator, so checking an operation is a single index
+CUBE = [DataType.ERROR] * (TYPE_COUNT * TYPE_COUNT * OPERATOR_COUNT)
+for left, rights in SEMANTIC_CUBE.items():
+    for right, results in rights.items():
+        for operator, symbol in OPERATOR_MAPPING.items():
+            if symbol in results:
+                index = (
+                    DataType[left.upper()] * TYPE_COUNT + DataType[right.upper()]
+                ) * OPERATOR_COUNT + operator
+                CUBE[index] = DataType[results[symbol].upper()]
 
-    operator_symbol = OPERATOR_MAPPING.get(operator)
-    if not operator_symbol:
-        return "error"
 
-    try:
-        result_type = SEMANTIC_CUBE[left_operand_type][right_operand_type][
-            operator_symbol
-        ]
-        return result_type
-    except KeyError:
-        print(
-            f"Error: Invalid operation {left_operand_type} {operator_symbol} {right_operand_type}"
-        )
-        return "error"
+def validate_semantics(
+    left_operand_type: DataType, right_operand_type: DataType, operator: Operator
+) -> DataType:
+    return CUBE[
+        (left_operand_type * TYPE_COUNT + right_operand_type) * OPERATOR_COUNT
+        + operator
+    ]
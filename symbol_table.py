@@ -1,20 +1,37 @@
+from enum import Enum
+
+
+class Kind(Enum):
+    PROGRAM = "program"
+    FUNCTION = "function"
+    VARIABLE = "var"
+    PARAMETER = "param"
+
+
 class Symbol:
     def __init__(
         self,
         name="undeclared",
-        data_type="undeclared",
+        data_type=None,
+        kind=None,
         address=None,
         child=None,
         index=None,
+        params=None,
     ):
         self.name = name
         self.data_type = data_type
+        self.kind = kind
         self.address = address
         self.child = child
         self.index = index
+        self.params = params if params is not None else []
 
     def __str__(self):
-        return f"[{self.address}] {self.name}: {self.data_type}"
+        kind = self.kind.value if self.kind is not None else "undeclared"
+        if self.data_type is None:
+            return f"[{self.address}] {self.name}: {kind}"
+        return f"[{self.address}] {self.name}: {kind}.{self.data_type}"
 
     def __repr__(self):
         return str(self)
@@ -49,3 +66,42 @@ class SymbolTable:
 
     def __str__(self):
         return "\n" + "\n".join(str(symbol) for symbol in self.symbols.values())
+
+
+class ScopedSymbolTable:
+    """
+    Variables of every open scope in one map from name to a stack of
+    bindings, innermost last, so resolving a name is a single dict lookup.
+    Each scope remembers the names it declared, which exit() unbinds.
+    """
+
+    def __init__(self):
+        self.bindings = {}
+        self.scopes = []
+
+    def enter(self):
+        self.scopes.append({})
+
+    def exit(self):
+        for name in self.scopes.pop():
+            bindings = self.bindings[name]
+            bindings.pop()
+            if not bindings:
+                del self.bindings[name]
+
+    def declare(self, symbol):
+        scope = self.scopes[-1]
+        if symbol.name in scope:
+            raise Exception(f"Symbol {symbol.name} is already declared.")
+        scope[symbol.name] = symbol
+        self.bindings.setdefault(symbol.name, []).append(symbol)
+
+    def lookup(self, name):
+        """The innermost symbol bound to name, or None."""
+        bindings = self.bindings.get(name)
+        return bindings[-1] if bindings else None
+
+    def __str__(self):
+        return "\n" + "\n".join(
+            str(symbol) for scope in self.scopes for symbol in scope.values()
+        )
@@ -0,0 +1,180 @@
+"""Small Ente programs the tests run on every engine."""
+
+NESTED_LOOPS = """
+program nested;
+var i, j, n, s, k : int;
+var f : float;
+main {
+    n = 7; s = 0; i = 0; k = 3;
+    while (i < n * 2) {
+        s = s + i * 4 + n * k;
+        j = 0;
+        while (j < 3) {
+            s = s + (n + k) * 2 + j * 5;
+            j = j + 1;
+        };
+        i = i + 1;
+    };
+    write(s);
+    i = 10;
+    f = 0.5;
+    while (i > 0) {
+        f = f + i * 3;
+        i = i - 2;
+        write(f);
+    };
+};
+end;
+"""
+
+RECURSION = """
+program recursion;
+var depth, calls : int;
+
+void down(n: int) {
+    var half : int;
+    calls = calls + 1;
+    if (n > 0) {
+        half = n - 1;
+        down(half);
+        write(n);
+    } else {
+        write("bottom");
+    };
+    depth = depth + n;
+};
+
+main {
+    depth = 0;
+    calls = 0;
+    down(4);
+    write(depth);
+    write(calls);
+};
+end;
+"""
+
+GLOBALS_IN_CALLEES = """
+program globals;
+var total, n : int;
+var scale : float;
+
+void bump(k: int) {
+    total = total + k * n;
+    scale = scale * 2;
+};
+
+void chain(d: int) {
+    var i : int;
+    i = 0;
+    while (i < d) {
+        bump(i);
+        i = i + 1;
+    };
+};
+
+main {
+    total = 1; n = 3; scale = 0.5;
+    bump(2);
+    write(total);
+    total = 5;
+    chain(3);
+    write(total);
+    write(scale);
+};
+end;
+"""
+
+IF_IN_WHILE = """
+program branches;
+var i, low, high : int;
+var ratio : float;
+
+main {
+    i = 0; low = 0; high = 0;
+    while (i < 10) {
+        if (i < 5) {
+            low = low + i;
+        } else {
+            high = high + 1;
+            ratio = high / 4;
+        };
+        if (i > 7) {
+            write(i);
+        };
+        i = i + 1;
+    };
+    write(low);
+    write(high);
+    write(ratio);
+};
+end;
+"""
+
+# the temporary a * b is compared in a fused branch after its slot was
+# shared with earlier temporaries
+FUSED_TEMPORARY = """
+program fused;
+var a, b, c : int;
+
+main {
+    a = 3; b = 4; c = 5;
+    write(a + b);
+    write(a * b);
+    if (c < a * b) {
+        write("less");
+    } else {
+        write("not less");
+    };
+    while (c > a + b - 4) {
+        c = c - 1;
+    };
+    write(c);
+};
+end;
+"""
+
+# folding these products at -O1 leaves infinite and NaN constants
+INFINITIES = """
+program infinities;
+var f, g : float;
+
+main {
+    f = 1.0e308 * 10.0;
+    g = 0.0 - 1.0e308 * 10.0;
+    write(f);
+    write(g);
+    write(f + g);
+    write(1.0e308 * 10.0 - 1.0e308 * 10.0);
+};
+end;
+"""
+
+# ints are unbounded: these go past 64 bits at run time and, once folded, at
+# compile time
+BIG_INTS = """
+program big;
+var p, i : int;
+
+main {
+    p = 1;
+    i = 0;
+    while (i < 30) {
+        p = p * 3 * 3;
+        i = i + 1;
+    };
+    write(p);
+    write(9223372036854775807 + 1);
+};
+end;
+"""
+
+PROGRAMS = {
+    "nested_loops": NESTED_LOOPS,
+    "recursion": RECURSION,
+    "globals_in_callees": GLOBALS_IN_CALLEES,
+    "if_in_while": IF_IN_WHILE,
+    "fused_temporary": FUSED_TEMPORARY,
+    "infinities": INFINITIES,
+    "big_ints": BIG_INTS,
+}
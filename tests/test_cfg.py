@@ -0,0 +1,113 @@
+from cfg import ControlFlowGraph
+from operators import Operator as Op
+
+# addresses in the global int, temporary bool, constant int and local int
+# segments
+I, J, X = 1000, 1001, 1002
+COND, INNER = 5000, 5001
+ZERO, ONE, FIVE = 6000, 6001, 6002
+LOCAL = 9000
+
+
+def test_loops_lists_nested_loops_innermost_first():
+    quads = [
+        [Op.ASSIGN, ZERO, -1, I],
+        [Op.LESS_THAN, I, FIVE, COND],
+        [Op.GOTOF, COND, -1, 10],
+        [Op.ASSIGN, ZERO, -1, J],
+        [Op.LESS_THAN, J, FIVE, INNER],
+        [Op.GOTOF, INNER, -1, 8],
+        [Op.ADD, J, ONE, J],
+        [Op.GOTO, -1, -1, 4],
+        [Op.ADD, I, ONE, I],
+        [Op.GOTO, -1, -1, 1],
+        [Op.PRINT, I, -1, -1],
+    ]
+
+    assert ControlFlowGraph(quads).loops() == [(4, 7), (1, 9)]
+
+
+def test_loops_finds_fused_branch_loops():
+    quads = [
+        [Op.ASSIGN, ZERO, -1, I],
+        [Op.ADD, I, ONE, I],
+        [Op.GOTOF_GREATER_THAN, I, FIVE, 1],
+        [Op.PRINT, I, -1, -1],
+    ]
+
+    assert ControlFlowGraph(quads).loops() == [(1, 2)]
+
+
+def test_loops_skips_loops_entered_past_the_header():
+    quads = [
+        [Op.GOTO, -1, -1, 2],
+        [Op.ADD, I, ONE, I],
+        [Op.LESS_THAN, I, FIVE, COND],
+        [Op.GOTOT, COND, -1, 1],
+        [Op.PRINT, I, -1, -1],
+    ]
+
+    assert ControlFlowGraph(quads).loops() == []
+
+
+def test_loops_skips_blocks_left_empty():
+    quads = [
+        [Op.ASSIGN, ZERO, -1, I],
+        [Op.ADD, I, ONE, I],
+        [Op.LESS_THAN, I, FIVE, COND],
+        [Op.GOTOT, COND, -1, 1],
+        None,
+    ]
+
+    assert ControlFlowGraph(quads).loops() == [(1, 3)]
+
+
+# main stores globals, then calls a function that reads I and writes X;
+# only X is read after the call
+CALL = [
+    [Op.GOTO, -1, -1, 5],
+    [Op.ADD, I, LOCAL, X],
+    [Op.ASSIGN, ZERO, -1, J],
+    [Op.PRINT, J, -1, -1],
+    [Op.ENDFUNC, -1, -1, -1],
+    [Op.ASSIGN, FIVE, -1, I],
+    [Op.ERA, -1, -1, 1],
+    [Op.PARAM, ONE, -1, LOCAL],
+    [Op.GOSUB, -1, -1, 1],
+    [Op.PRINT, X, -1, -1],
+]
+
+
+def live_after(cfg, index):
+    for block in cfg.blocks:
+        if block.start <= index < block.end:
+            for i, _, live in cfg.transfer(block, set(block.live_out)):
+                if i == index:
+                    return set(live)
+
+
+def test_liveness_keeps_globals_live_into_a_call():
+    cfg = ControlFlowGraph(CALL)
+    cfg.liveness()
+
+    assert cfg.globals == {I, J, X}
+    assert I in live_after(cfg, 5)
+    assert cfg.block_at[1].live_in >= {I, LOCAL}
+
+
+def test_liveness_keeps_globals_live_past_endfunc():
+    cfg = ControlFlowGraph(CALL)
+    cfg.liveness()
+
+    function = cfg.block_at[1]
+    assert function.successors == []
+    assert function.live_out == {I, J, X}
+    assert J in live_after(cfg, 2)
+
+
+def test_liveness_does_not_carry_locals_past_endfunc():
+    cfg = ControlFlowGraph(CALL)
+    cfg.liveness()
+
+    assert LOCAL not in cfg.block_at[1].live_out
+    assert live_after(cfg, 8) == {X}
@@ -0,0 +1,99 @@
+import io
+
+import pytest
+
+from ente import Limits, compile_source
+from output import OutputBuffer
+from pipeline import execute_buffer
+from programs import BIG_INTS, INFINITIES, PROGRAMS, RECURSION
+from tracer import PrintTracer
+from vm import Engine
+
+# every engine but the compiled one runs under a tracer
+TRACING = [Engine.REFERENCE, Engine.RESOLVED, Engine.THREADED]
+
+FOREVER = """
+program forever;
+var a : int;
+
+main {
+    a = 1;
+    while (a > 0) {
+        a = a + 1;
+    };
+};
+end;
+"""
+
+
+def trace(program, engine):
+    stream = io.StringIO()
+    execute_buffer(
+        program.bytecode, engine, PrintTracer(stream), OutputBuffer(io.StringIO())
+    )
+    return stream.getvalue()
+
+
+def counters(program, engine):
+    result = program.run(engine=engine, count=True)
+    assert result.ok, result.error
+    return {name: value for name, value in result.counters.items() if name != "elapsed"}
+
+
+@pytest.mark.parametrize("engine", TRACING)
+@pytest.mark.parametrize("level", [0, 1, 2])
+@pytest.mark.parametrize("name", list(PROGRAMS))
+def test_trace_matches_the_reference_engine(name, level, engine):
+    program = compile_source(PROGRAMS[name], level)
+
+    assert trace(program, engine) == trace(program, Engine.REFERENCE)
+
+
+@pytest.mark.parametrize("engine", TRACING)
+@pytest.mark.parametrize("level", [0, 1, 2])
+@pytest.mark.parametrize("name", list(PROGRAMS))
+def test_counters_match_the_reference_engine(name, level, engine):
+    program = compile_source(PROGRAMS[name], level)
+
+    assert counters(program, engine) == counters(program, Engine.REFERENCE)
+
+
+@pytest.mark.parametrize("engine", TRACING)
+def test_branch_limit_stops_a_loop(engine):
+    result = compile_source(FOREVER).run(engine=engine, limits=Limits(max_branches=100))
+
+    assert result.status == "limit"
+    assert result.error == "took more than 100 branches"
+    assert result.counters["branches"] == 101
+
+
+@pytest.mark.parametrize("engine", TRACING)
+def test_depth_limit_stops_recursion(engine):
+    result = compile_source(RECURSION).run(engine=engine, limits=Limits(max_depth=3))
+
+    assert result.status == "limit"
+    assert result.error == "calls nested deeper than 3"
+
+
+@pytest.mark.parametrize("level", [0, 1, 2])
+def test_compiled_engine_inlines_infinite_and_nan_constants(level):
+    result = compile_source(INFINITIES, level).run(engine=Engine.COMPILED)
+
+    assert result.ok, result.error
+    assert result.output == "inf\n-inf\nnan\nnan\n"
+
+
+@pytest.mark.parametrize("engine", list(Engine))
+@pytest.mark.parametrize("level", [0, 1, 2])
+def test_ints_go_past_64_bits(level, engine):
+    result = compile_source(BIG_INTS, level).run(engine=engine)
+
+    assert result.ok, result.error
+    assert result.output == "42391158275216203514294433201\n9223372036854775808\n"
+
+
+def test_compiled_engine_refuses_to_count():
+    result = compile_source(RECURSION).run(engine=Engine.COMPILED, count=True)
+
+    assert result.status == "error"
+    assert "does not support tracing" in result.error
@@ -0,0 +1,39 @@
+import pytest
+
+from ente import compile_source
+from programs import (
+    FUSED_TEMPORARY,
+    GLOBALS_IN_CALLEES,
+    PROGRAMS,
+    RECURSION,
+)
+from vm import Engine
+
+
+def unoptimized_output(source):
+    result = compile_source(source, level=0).run(engine=Engine.REFERENCE)
+    assert result.ok, result.error
+    return result.output
+
+
+@pytest.mark.parametrize("engine", list(Engine))
+@pytest.mark.parametrize("level", [0, 1, 2])
+@pytest.mark.parametrize("name", list(PROGRAMS))
+def test_output_matches_across_levels_and_engines(name, level, engine):
+    source = PROGRAMS[name]
+    result = compile_source(source, level).run(engine=engine)
+
+    assert result.ok, result.error
+    assert result.output == unoptimized_output(source)
+
+
+def test_globals_written_in_callees_reach_the_caller():
+    assert unoptimized_output(GLOBALS_IN_CALLEES) == "7\n14\n8.0\n"
+
+
+def test_fused_branches_read_renamed_temporaries():
+    assert unoptimized_output(FUSED_TEMPORARY) == "7\n12\nless\n3\n"
+
+
+def test_recursion_unwinds_in_order():
+    assert unoptimized_output(RECURSION) == "bottom\n1\n2\n3\n4\n10\n5\n"
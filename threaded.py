@@ -0,0 +1,173 @@
+from operators import BRANCHES, OPERATIONS, Operator
+
+
+def compile_closures(vm, code) -> list:
+    """
+    Turns flat bytecode into one closure per quadruple, with its operand
+    slots, operation and successor bound in. Slots index the memory manager's
+    segment table, which follows the active frame. Each closure runs its
+    quadruple and returns the index of the next one to run, so the virtual
+    machine only has to trampoline through them.
+    """
+    memory_manager = vm.memory_manager
+    segments = memory_manager.segments
+    function_exit = vm.function_exit
+    tracer = vm.tracer
+    write = vm.output.write
+
+    closures = []
+
+    for ip, (operator, operation, left, right, result) in enumerate(vm.load(code)):
+        if operation is not None:
+            closures.append(
+                _operation(segments, operation, left, right, result, ip + 1)
+            )
+            continue
+
+        match operator:
+            case Operator.ASSIGN:
+                closures.append(_assign(segments, left, result, ip + 1))
+            case Operator.GOTO:
+                closures.append(_goto(tracer, ip, result))
+            case Operator.GOTOF:
+                closures.append(_goto_if(segments, tracer, ip, left, result, False))
+            case Operator.GOTOT:
+                closures.append(_goto_if(segments, tracer, ip, left, result, True))
+            case _ if operator in BRANCHES:
+                comparison = OPERATIONS[BRANCHES[operator]]
+                closures.append(
+                    _goto_unless(segments, tracer, ip, comparison, left, right, result)
+                )
+            case Operator.PRINT:
+                closures.append(_print(segments, write, left, ip + 1))
+            case Operator.ERA:
+                closures.append(_era(memory_manager, result, ip + 1))
+            case Operator.PARAM:
+                closures.append(_param(memory_manager, tracer, ip, left, result))
+            case Operator.GOSUB:
+                closures.append(
+                    _gosub(memory_manager, function_exit, tracer, ip, result)
+                )
+            case Operator.ENDFUNC:
+                closures.append(_endfunc(memory_manager, function_exit, tracer, ip))
+            case _:
+                raise ValueError(f"Unsupported operator: {operator}")
+
+    return closures
+
+
+def _operation(segments, operation, left, right, result, next_ip):
+    left_segment, left_index, _ = left
+    right_segment, right_index, _ = right
+    segment, index, cast = result
+
+    def run():
+        segments[segment][index] = cast(
+            operation(
+                segments[left_segment][left_index], segments[right_segment][right_index]
+            )
+        )
+        return next_ip
+
+    return run
+
+
+def _assign(segments, left, result, next_ip):
+    left_segment, left_index, _ = left
+    segment, index, cast = result
+
+    def run():
+        segments[segment][index] = cast(segments[left_segment][left_index])
+        return next_ip
+
+    return run
+
+
+def _goto(tracer, ip, target):
+    def run():
+        if tracer is not None:
+            tracer.on_branch(ip, target, True)
+        return target
+
+    return run
+
+
+def _goto_if(segments, tracer, ip, left, target, expected):
+    segment, index, _ = left
+    next_ip = ip + 1
+
+    def run():
+        taken = bool(segments[segment][index]) == expected
+        if tracer is not None:
+            tracer.on_branch(ip, target, taken)
+        return target if taken else next_ip
+
+    return run
+
+
+def _goto_unless(segments, tracer, ip, comparison, left, right, target):
+    left_segment, left_index, _ = left
+    right_segment, right_index, _ = right
+    next_ip = ip + 1
+
+    def run():
+        taken = not comparison(
+            segments[left_segment][left_index], segments[right_segment][right_index]
+        )
+        if tracer is not None:
+            tracer.on_branch(ip, target, taken)
+        return target if taken else next_ip
+
+    return run
+
+
+def _print(segments, write, left, next_ip):
+    segment, index, _ = left
+
+    def run():
+        write(segments[segment][index])
+        return next_ip
+
+    return run
+
+
+def _era(memory_manager, function, next_ip):
+    def run():
+        memory_manager.allocate_local(function)
+        return next_ip
+
+    return run
+
+
+def _param(memory_manager, tracer, ip, address, slot):
+    def run():
+        memory_manager.param(address, slot)
+        if tracer is not None:
+            tracer.on_param(ip, slot, memory_manager.access(address))
+        return ip + 1
+
+    return run
+
+
+def _gosub(memory_manager, function_exit, tracer, ip, target):
+    def run():
+        if tracer is not None:
+            tracer.on_call(ip, memory_manager.pending[0], target)
+        memory_manager.activate_local()
+        function_exit.append(ip + 1)
+        return target
+
+    return run
+
+
+def _endfunc(memory_manager, function_exit, tracer, ip):
+    def run():
+        memory_manager.deallocate_local()
+        next_func = function_exit.pop()
+        if next_func is None:
+            raise RuntimeError("error in function_exit stack")
+        if tracer is not None:
+            tracer.on_return(ip, next_func)
+        return next_func
+
+    return run
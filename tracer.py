@@ -0,0 +1,87 @@
+import sys
+
+
+class Tracer:
+    """
+    Receives events from the virtual machine as it runs. Every event gets the
+    index of the quadruple that raised it. Subclasses override the events they
+    care about; the rest do nothing.
+    """
+
+    def on_call(self, ip, function, target):
+        pass
+
+    def on_return(self, ip, target):
+        pass
+
+    def on_param(self, ip, slot, value):
+        pass
+
+    def on_branch(self, ip, target, taken):
+        pass
+
+    def on_store(self, ip, address, value):
+        pass
+
+
+class PrintTracer(Tracer):
+    """Writes one line per event, to stderr by default."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+
+    def on_call(self, ip, function, target):
+        print(f"{ip}: call {function} -> {target}", file=self.stream)
+
+    def on_return(self, ip, target):
+        print(f"{ip}: return -> {target}", file=self.stream)
+
+    def on_param(self, ip, slot, value):
+        print(f"{ip}: param [{slot}] = {value}", file=self.stream)
+
+    def on_branch(self, ip, target, taken):
+        print(
+            f"{ip}: branch -> {target} {'taken' if taken else 'not taken'}",
+            file=self.stream,
+        )
+
+    def on_store(self, ip, address, value):
+        print(f"{ip}: store [{address}] = {value}", file=self.stream)
+
+
+class CountingTracer(Tracer):
+    """Counts events, and tracks how deep calls go."""
+
+    def __init__(self):
+        self.calls = 0
+        self.params = 0
+        self.branches = 0
+        self.stores = 0
+        self.depth = 0
+        self.max_depth = 0
+
+    def on_call(self, ip, function, target):
+        self.calls += 1
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def on_return(self, ip, target):
+        self.depth -= 1
+
+    def on_param(self, ip, slot, value):
+        self.params += 1
+
+    def on_branch(self, ip, target, taken):
+        self.branches += 1
+
+    def on_store(self, ip, address, value):
+        self.stores += 1
+
+    def counters(self) -> dict:
+        return {
+            "calls": self.calls,
+            "params": self.params,
+            "branches": self.branches,
+            "stores": self.stores,
+            "max_depth": self.max_depth,
+        }
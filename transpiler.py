@@ -0,0 +1,296 @@
+import hashlib
+import marshal
+import math
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+
+from cache import write_atomic
+from memory import OFFSETS, MemoryManager, get_type
+from operators import BRANCHES, OPERATIONS, Operator
+
+# Compiled programs are cached as a header followed by a marshalled code
+# object. The key covers the quadruples, the constant values inlined into the
+# source, this transpiler's version and the running Python's bytecode magic.
+CACHE_MAGIC = b"ENTEPY"
+TRANSPILER_VERSION = 2
+
+JUMPS = (Operator.GOTO, Operator.GOTOF, Operator.GOTOT, Operator.GOSUB, *BRANCHES)
+
+SYMBOLS = {
+    Operator.SUBTRACT: "-",
+    Operator.ADD: "+",
+    Operator.MULTIPLY: "*",
+    Operator.DIVIDE: "/",
+    Operator.LESS_THAN: "<",
+    Operator.GREATER_THAN: ">",
+    Operator.LESS_EQUAL: "<=",
+    Operator.GREATER_EQUAL: ">=",
+    Operator.EQUAL: "==",
+    Operator.NOT_EQUAL: "!=",
+}
+
+
+def load_program(code, memory_manager: MemoryManager, cache: Path | None = None):
+    """
+    Returns the program function for flat bytecode, taking it from cache when
+    the cached code object was built from the same quadruples and constants.
+    """
+    quads = [tuple(code[i : i + 4]) for i in range(0, len(code), 4)]
+    transpiler = Transpiler(quads, memory_manager)
+    key = transpiler.key()
+
+    compiled = None
+    if cache is not None:
+        compiled = read_cache(cache, CACHE_MAGIC + MAGIC_NUMBER + key)
+
+    if compiled is None:
+        compiled = compile(transpiler.source(), "<ente>", "exec")
+        if cache is not None:
+            write_cache(cache, CACHE_MAGIC + MAGIC_NUMBER + key, compiled)
+
+    namespace = {}
+    exec(compiled, namespace)
+    return namespace["program"]
+
+
+def read_cache(cache: Path, header: bytes):
+    """The cached code object, or None if it is missing, stale or unreadable."""
+    try:
+        data = cache.read_bytes()
+        if data.startswith(header):
+            return marshal.loads(data[len(header) :])
+    except (OSError, EOFError, ValueError):
+        pass
+    return None
+
+
+def write_cache(cache: Path, header: bytes, compiled):
+    """
+    Writes the code object to cache, skipping a cache that can't be written,
+    say in a read-only directory.
+    """
+    try:
+        write_atomic(cache, header + marshal.dumps(compiled))
+    except OSError:
+        pass
+
+
+class Transpiler:
+    """
+    Turns quadruples into the source of a single Python function. Every basic
+    block becomes straight-line code behind a binary-search dispatcher on the
+    block's first quadruple index. Global variables and temporaries become
+    Python locals, constants become literals, and function locals index the
+    arrays of the frame on top of the memory stack.
+    """
+
+    def __init__(self, quads, memory_manager: MemoryManager):
+        self.quads = quads
+        self.memory_manager = memory_manager
+        self.constants = memory_manager.memory.first()
+
+    def key(self) -> bytes:
+        digest = hashlib.sha256(str(TRANSPILER_VERSION).encode())
+        digest.update(repr(self.quads).encode())
+        for mem_type in ("c_int", "c_float", "c_string"):
+            if mem_type in self.constants:
+                digest.update(repr(list(self.constants[mem_type].memory)).encode())
+        return digest.digest()
+
+    def source(self) -> str:
+        lines = ["def program(manager, write, function_exit):"]
+        body = []
+
+        variables = sorted(
+            {
+                address
+                for quad in self.quads
+                for address in self.addresses(quad)
+                if get_type(address)[0] in "gt" and get_type(address) != "g_void"
+            }
+        )
+        segments = sorted({get_type(address) for address in variables})
+
+        body.append("g = manager.memory.first()")
+        for mem_type in segments:
+            body.append(f'{mem_type} = g["{mem_type}"].memory')
+        for address in variables:
+            body.append(f"{self.name(address)} = {self.read(address)}")
+        body.append("l_int = l_float = None")
+        body.append("block = 0")
+        body.append("while True:")
+
+        leaders = self.leaders()
+        self.dispatch(body, leaders, 0, len(leaders), 1)
+
+        for address in variables:
+            body.append(f"{self.read(address)} = {self.name(address)}")
+
+        lines.extend(f"    {line}" for line in body)
+        return "\n".join(lines) + "\n"
+
+    def leaders(self):
+        leaders = {0, len(self.quads)}
+        for i, (operator, _, _, result) in enumerate(self.quads):
+            if operator in JUMPS:
+                leaders.add(result)
+            if operator in JUMPS or operator == Operator.ENDFUNC:
+                leaders.add(i + 1)
+        return sorted(leader for leader in leaders if leader <= len(self.quads))
+
+    def dispatch(self, lines, leaders, lo, hi, depth):
+        indent = "    " * depth
+        if hi - lo == 1:
+            for line in self.block(leaders, lo):
+                lines.append(f"{indent}{line}")
+            return
+
+        mid = (lo + hi) // 2
+        lines.append(f"{indent}if block < {leaders[mid]}:")
+        self.dispatch(lines, leaders, lo, mid, depth + 1)
+        lines.append(f"{indent}else:")
+        self.dispatch(lines, leaders, mid, hi, depth + 1)
+
+    def block(self, leaders, position):
+        start = leaders[position]
+        if start == len(self.quads):
+            return ["break"]
+
+        end = leaders[position + 1]
+        lines = []
+
+        for i in range(start, end):
+            operator, left, right, result = self.quads[i]
+
+            if operator in OPERATIONS:
+                value = f"{self.value(left)} {SYMBOLS[operator]} {self.value(right)}"
+                lines.append(
+                    self.store(result, value, self.result_type(*self.quads[i]))
+                )
+                continue
+
+            if operator in BRANCHES:
+                symbol = SYMBOLS[BRANCHES[operator]]
+                condition = f"{self.value(left)} {symbol} {self.value(right)}"
+                lines.append(f"block = {result} if not ({condition}) else {i + 1}")
+                lines.append("continue")
+                continue
+
+            match operator:
+                case Operator.ASSIGN:
+                    lines.append(
+                        self.store(result, self.value(left), self.data_type(left))
+                    )
+                case Operator.PRINT:
+                    lines.append(f"write({self.value(left)})")
+                case Operator.GOTO:
+                    lines.append(f"block = {result}")
+                    lines.append("continue")
+                case Operator.GOTOF:
+                    lines.append(
+                        f"block = {result} if not {self.value(left)} else {i + 1}"
+                    )
+                    lines.append("continue")
+                case Operator.GOTOT:
+                    lines.append(f"block = {result} if {self.value(left)} else {i + 1}")
+                    lines.append("continue")
+                case Operator.ERA:
+                    lines.append(f"manager.allocate_local({result})")
+                case Operator.PARAM:
+                    mem_type = get_type(result)
+                    value = self.cast(
+                        self.value(left), self.data_type(left), self.data_type(result)
+                    )
+                    lines.append(
+                        f'manager.pending[1]["{mem_type}"].memory[{result - OFFSETS[mem_type]}] = {value}'
+                    )
+                case Operator.GOSUB:
+                    lines.append("manager.activate_local()")
+                    lines.append(f"function_exit.append({i + 1})")
+                    lines.extend(self.load_frame())
+                    lines.append(f"block = {result}")
+                    lines.append("continue")
+                case Operator.ENDFUNC:
+                    lines.append("manager.deallocate_local()")
+                    lines.extend(self.load_frame())
+                    lines.append("block = function_exit.pop()")
+                    lines.append("continue")
+                case _:
+                    raise ValueError(f"Unsupported operator: {operator}")
+
+        if not lines or lines[-1] != "continue":
+            lines.append(f"block = {end}")
+            lines.append("continue")
+
+        return lines
+
+    def load_frame(self):
+        return [
+            "frame = manager.memory.peek()",
+            'l_int = frame["l_int"].memory if "l_int" in frame else None',
+            'l_float = frame["l_float"].memory if "l_float" in frame else None',
+        ]
+
+    def addresses(self, quad):
+        operator, left, right, result = quad
+        if operator in OPERATIONS:
+            return (left, right, result)
+        if operator in BRANCHES:
+            return (left, right)
+        if operator == Operator.ASSIGN:
+            return (left, result)
+        if operator in (Operator.PRINT, Operator.PARAM, Operator.GOTOF, Operator.GOTOT):
+            return (left,)
+        return ()
+
+    def name(self, address):
+        return f"v{address}"
+
+    def read(self, address):
+        mem_type = get_type(address)
+        return f"{mem_type}[{address - OFFSETS[mem_type]}]"
+
+    def value(self, address):
+        mem_type = get_type(address)
+        if mem_type.startswith("c"):
+            value = self.constants[mem_type].access(address)
+            # folding can produce infinities and NaN, whose repr isn't a literal
+            if isinstance(value, float) and not math.isfinite(value):
+                return f"float('{value!r}')"
+            return repr(value)
+        if mem_type.startswith("l"):
+            return self.read(address)
+        if mem_type == "g_void":
+            return "None"
+        return self.name(address)
+
+    def store(self, address, value, value_type):
+        value = self.cast(value, value_type, self.data_type(address))
+        if get_type(address).startswith("l"):
+            return f"{self.read(address)} = {value}"
+        return f"{self.name(address)} = {value}"
+
+    def cast(self, value, value_type, target_type):
+        # stores cast like MemorySegment.assign, but only when the static
+        # type of the value can differ from the segment's
+        if value_type == target_type:
+            return value
+        return f"{target_type}({value})".replace("string(", "str(")
+
+    def data_type(self, address):
+        return get_type(address).split("_")[1]
+
+    def result_type(self, operator, left, right, _):
+        if operator not in (
+            Operator.ADD,
+            Operator.SUBTRACT,
+            Operator.MULTIPLY,
+            Operator.DIVIDE,
+        ):
+            return "bool"
+        if operator == Operator.DIVIDE or "float" in (
+            self.data_type(left),
+            self.data_type(right),
+        ):
+            return "float"
+        return "int"
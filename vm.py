@@ -1,83 +1,355 @@
+from enum import Enum
+from pathlib import Path
+
+from bytecode import LineTable
 from memory import MemoryManager
-from quadruples import Quadruple
-from operators import Operator, perform_operation
+from quadruples import Quadruple, unpack
+from output import OutputBuffer
+from profiler import Profiler
+from operators import BRANCHES, OPERATIONS, Operator, perform_operation
 from stack import Stack
+from threaded import compile_closures
+from tracer import Tracer
+from transpiler import load_program
+
+# the comparison behind each compare-and-branch instruction
+COMPARISONS = {
+    branch: OPERATIONS[comparison] for branch, comparison in BRANCHES.items()
+}
+
+# instructions whose result operand is a jump target or function, not a store
+NO_STORE = frozenset(
+    (Operator.GOTOF, Operator.GOTOT, Operator.ERA, Operator.PARAM, *BRANCHES)
+)
+
+
+class Engine(str, Enum):
+    REFERENCE = "reference"
+    RESOLVED = "resolved"
+    THREADED = "threaded"
+    COMPILED = "compiled"
 
 
 class VirtualMachine:
-    def __init__(self, memory_manager: MemoryManager) -> None:
+    def __init__(
+        self,
+        memory_manager: MemoryManager,
+        tracer: Tracer | None = None,
+        output: OutputBuffer | None = None,
+        profiler: Profiler | None = None,
+    ) -> None:
         self.memory_manager = memory_manager
         self.function_exit = Stack("function_exit")
+        self.tracer = tracer
+        self.output = output if output is not None else OutputBuffer()
+        self.profiler = profiler
+        self.lines = None
+
+    def run(
+        self,
+        code,
+        engine: Engine = Engine.REFERENCE,
+        cache: Path | None = None,
+        lines: LineTable | None = None,
+    ):
+        """
+        Runs flat bytecode, 4 ints per quadruple, on the chosen engine. The
+        compiled engine keeps the Python code it generates in cache, if given.
+        With lines, errors and profiles name the source line of a quadruple.
+        """
+        if self.profiler is not None and engine != Engine.REFERENCE:
+            raise ValueError("Profiling runs on the reference engine only")
+
+        self.lines = lines
+        if self.profiler is not None:
+            self.profiler.lines = lines
+
+        try:
+            match engine:
+                case Engine.REFERENCE:
+                    self.execute(unpack(code))
+                case Engine.RESOLVED:
+                    self.execute_resolved(code)
+                case Engine.THREADED:
+                    self.execute_threaded(code)
+                case Engine.COMPILED:
+                    self.execute_compiled(code, cache)
+                case _:
+                    raise ValueError(f"Unsupported engine: {engine}")
+        finally:
+            self.output.flush()
 
     def execute(self, quadruples: list[Quadruple]):
+        tracer = self.tracer
+        profiler = self.profiler
+        write = self.output.write
         ip = 0
 
-        while ip < len(quadruples):
-            curr = quadruples[ip]
-
-            left_operand = (
-                self.memory_manager.access(curr.left_operand)
-                if curr.left_operand != -1
-                else None
-            )
-            right_operand = (
-                self.memory_manager.access(curr.right_operand)
-                if curr.right_operand != -1
-                else None
-            )
-
-            result = curr.result
-
-            # Handling operations
-            match curr.operator:
-                case Operator.PRINT:
-                    print(left_operand)
-                case Operator.GOTO:
-                    ip = result
-                    continue
-                case Operator.GOTOF:
-                    if not left_operand:
+        try:
+            while ip < len(quadruples):
+                curr = quadruples[ip]
+                if profiler is not None:
+                    profiler.step(ip, curr)
+
+                left_operand = (
+                    self.memory_manager.access(curr.left_operand)
+                    if curr.left_operand != -1
+                    else None
+                )
+                right_operand = (
+                    self.memory_manager.access(curr.right_operand)
+                    if curr.right_operand != -1
+                    else None
+                )
+
+                result = curr.result
+
+                # Handling operations
+                match curr.operator:
+                    case Operator.PRINT:
+                        write(left_operand)
+                    case Operator.GOTO:
+                        if tracer is not None:
+                            tracer.on_branch(ip, result, True)
                         ip = result
                         continue
-                case Operator.GOTOT:
-                    if left_operand:
+                    case Operator.GOTOF | Operator.GOTOT:
+                        taken = bool(left_operand) == (curr.operator == Operator.GOTOT)
+                        if tracer is not None:
+                            tracer.on_branch(ip, result, taken)
+                        if taken:
+                            ip = result
+                            continue
+                    case operator if operator in BRANCHES:
+                        taken = not perform_operation(
+                            BRANCHES[operator], left_operand, right_operand
+                        )
+                        if tracer is not None:
+                            tracer.on_branch(ip, result, taken)
+                        if taken:
+                            ip = result
+                            continue
+                    case Operator.GOSUB:
+                        if tracer is not None:
+                            tracer.on_call(ip, self.memory_manager.pending[0], result)
+                        self.memory_manager.activate_local()
+                        self.function_exit.append(ip + 1)
                         ip = result
                         continue
-                case Operator.GOSUB:
-                    self.function_exit.append(ip + 1)
-                    ip = result
+                    case Operator.ERA:
+                        self.memory_manager.allocate_local(curr.result)
+                    case Operator.ENDFUNC:
+                        self.memory_manager.deallocate_local()
+                        next_func = self.function_exit.pop()
+                        if tracer is not None:
+                            tracer.on_return(ip, next_func)
+                        if next_func is not None:
+                            ip = next_func
+                        else:
+                            print(f"error in function_exit stack")
+                        continue
+                    case Operator.PARAM:
+                        self.memory_manager.param(curr.left_operand, curr.result)
+                        if tracer is not None:
+                            tracer.on_param(ip, curr.result, left_operand)
+                    case Operator.ASSIGN:
+                        result = self.memory_manager.access(curr.left_operand)
+                    case _:
+                        try:
+                            if left_operand is None or right_operand is None:
+                                raise ValueError(
+                                    f"Invalid operands: {left_operand} {right_operand}"
+                                )
+                            result = perform_operation(
+                                curr.operator, left_operand, right_operand
+                            )
+                        except ValueError as e:
+                            raise ValueError(
+                                f"Unsupported operator: {curr.operator}"
+                            ) from e
+
+                if curr.result != -1 and curr.operator not in NO_STORE:
+                    self.memory_manager.assign(curr.result, result)
+                    if tracer is not None:
+                        tracer.on_store(
+                            ip, curr.result, self.memory_manager.access(curr.result)
+                        )
+
+                ip += 1
+        except Exception as e:
+            self.locate(e, ip)
+            raise
+
+        if profiler is not None:
+            profiler.stop()
+
+    def locate(self, error, ip):
+        """Notes on error which quadruple, and source line, raised it."""
+        if self.lines is not None and 0 <= ip < len(self.lines):
+            line, column = self.lines[ip]
+            error.add_note(f"at line {line}, column {column} (quadruple {ip})")
+        else:
+            error.add_note(f"at quadruple {ip}")
+
+    def load(self, code) -> list[tuple]:
+        """
+        Decodes flat bytecode into (operator, operation, left, right, result)
+        instructions whose operands are (segment, index, cast) slots resolved
+        ahead of time. Jump targets are left as plain quadruple indexes.
+
+        With a tracer attached, result slots get a cast that also reports the
+        store, so tracing costs nothing on the store path when it is off.
+        """
+        resolve = self.memory_manager.resolve
+        program = []
+
+        for i in range(0, len(code), 4):
+            operator, left_operand, right_operand, result_operand = code[i : i + 4]
+
+            left = resolve(left_operand) if left_operand != -1 else None
+            right = resolve(right_operand) if right_operand != -1 else None
+            result = resolve(result_operand) if result_operand != -1 else None
+
+            match operator:
+                case (
+                    Operator.GOTO
+                    | Operator.GOTOF
+                    | Operator.GOTOT
+                    | Operator.GOSUB
+                    | Operator.ERA
+                ):
+                    result = result_operand
+                case _ if operator in BRANCHES:
+                    result = result_operand
+                case Operator.PARAM:
+                    left = left_operand
+                    result = result_operand
+                case _ if result is not None and self.tracer is not None:
+                    segment, index, cast = result
+                    result = (
+                        segment,
+                        index,
+                        self._traced(cast, i // 4, result_operand),
+                    )
+
+            program.append((operator, OPERATIONS.get(operator), left, right, result))
+
+        return program
+
+    def _traced(self, cast, ip, address):
+        on_store = self.tracer.on_store
+
+        def traced(value):
+            value = cast(value)
+            on_store(ip, address, value)
+            return value
+
+        return traced
+
+    def execute_resolved(self, code):
+        program = self.load(code)
+        segments = self.memory_manager.segments
+        tracer = self.tracer
+        write = self.output.write
+        end = len(program)
+        ip = 0
+
+        try:
+            while ip < end:
+                operator, operation, left, right, result = program[ip]
+
+                if operation is not None:
+                    segment, index, cast = result
+                    segments[segment][index] = cast(
+                        operation(
+                            segments[left[0]][left[1]], segments[right[0]][right[1]]
+                        )
+                    )
+                    ip += 1
                     continue
-                case Operator.ERA:
-                    self.memory_manager.allocate_local()
-                    print(f"Function memory allocated for {curr.result}")
-                case Operator.ENDFUNC:
-                    self.memory_manager.deallocate_local()
-                    next_func = self.function_exit.pop()
-                    if next_func is not None:
-                        ip = next_func
-                    else:
-                        print(f"error in function_exit stack")
+
+                comparison = COMPARISONS.get(operator)
+                if comparison is not None:
+                    taken = not comparison(
+                        segments[left[0]][left[1]], segments[right[0]][right[1]]
+                    )
+                    if tracer is not None:
+                        tracer.on_branch(ip, result, taken)
+                    ip = result if taken else ip + 1
                     continue
-                case Operator.PARAM:
-                    self.memory_manager.param(curr.left_operand)
-                    print(f"Parameter {left_operand} added to function memory")
-                case Operator.ASSIGN:
-                    result = self.memory_manager.access(curr.left_operand)
-                case _:
-                    try:
-                        if left_operand is None or right_operand is None:
-                            raise ValueError(
-                                f"Invalid operands: {left_operand} {right_operand}"
+
+                match operator:
+                    case Operator.ASSIGN:
+                        segment, index, cast = result
+                        segments[segment][index] = cast(segments[left[0]][left[1]])
+                    case Operator.GOTO:
+                        if tracer is not None:
+                            tracer.on_branch(ip, result, True)
+                        ip = result
+                        continue
+                    case Operator.GOTOF:
+                        taken = not segments[left[0]][left[1]]
+                        if tracer is not None:
+                            tracer.on_branch(ip, result, taken)
+                        if taken:
+                            ip = result
+                            continue
+                    case Operator.GOTOT:
+                        taken = bool(segments[left[0]][left[1]])
+                        if tracer is not None:
+                            tracer.on_branch(ip, result, taken)
+                        if taken:
+                            ip = result
+                            continue
+                    case Operator.PRINT:
+                        write(segments[left[0]][left[1]])
+                    case Operator.GOSUB:
+                        if tracer is not None:
+                            tracer.on_call(ip, self.memory_manager.pending[0], result)
+                        self.memory_manager.activate_local()
+                        self.function_exit.append(ip + 1)
+                        ip = result
+                        continue
+                    case Operator.ERA:
+                        self.memory_manager.allocate_local(result)
+                    case Operator.ENDFUNC:
+                        self.memory_manager.deallocate_local()
+                        next_func = self.function_exit.pop()
+                        if next_func is None:
+                            raise RuntimeError("error in function_exit stack")
+                        if tracer is not None:
+                            tracer.on_return(ip, next_func)
+                        ip = next_func
+                        continue
+                    case Operator.PARAM:
+                        self.memory_manager.param(left, result)
+                        if tracer is not None:
+                            tracer.on_param(
+                                ip, result, self.memory_manager.access(left)
                             )
-                        result = perform_operation(
-                            curr.operator, left_operand, right_operand
-                        )
-                    except ValueError as e:
-                        raise ValueError(
-                            f"Unsupported operator: {curr.operator}"
-                        ) from e
+                    case _:
+                        raise ValueError(f"Unsupported operator: {operator}")
+
+                ip += 1
+        except Exception as e:
+            self.locate(e, ip)
+            raise
+
+    def execute_threaded(self, code):
+        program = compile_closures(self, code)
+        end = len(program)
+        ip = 0
+
+        try:
+            while ip < end:
+                ip = program[ip]()
+        except Exception as e:
+            self.locate(e, ip)
+            raise
 
-            if result != -1 and curr.operator not in [Operator.GOTOF]:
-                self.memory_manager.assign(curr.result, result)
+    def execute_compiled(self, code, cache: Path | None = None):
+        if self.tracer is not None:
+            raise ValueError("The compiled engine does not support tracing")
 
-            ip += 1
+        program = load_program(code, self.memory_manager, cache)
+        program(self.memory_manager, self.output.write, self.function_exit)